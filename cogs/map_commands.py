@@ -1,4 +1,8 @@
+import asyncio
+import copy
+import io
 import json
+import typing as t
 from operator import le
 import re
 from datetime import datetime
@@ -8,7 +12,7 @@ from multiprocessing import Process
 
 import discord
 from discord.commands import SlashCommandGroup, slash_command, default_permissions
-from discord.ext import commands, pages, tasks
+from discord.ext import commands, pages
 
 import not1x
 import ui_utils
@@ -22,9 +26,20 @@ from utils import addhelp, most_color
 _logger = setlog(__name__)
 
 
+async def map_autocomplete(ctx: discord.AutocompleteContext) -> t.List[str]:
+    """
+    complete the last space separated map of the option value
+    """
+    value: str = ctx.value or ""
+    *prev, token = value.split(" ") if value else [""]
+    prefix = " ".join(prev + [""])
+    return [(prefix + m)[:100] for m in ctx.bot.maps.complete(token) if len(prefix + m) <= 100]
+
+
 class MapCommands(commands.Cog):
     def __init__(self, bot: not1x.Bot) -> None:
         self.bot = bot
+        self._update_task: asyncio.Task | None = None
 
     server = SlashCommandGroup("server", "Commands for source server")
     notify = SlashCommandGroup("notify", "Group for notify command")
@@ -37,7 +52,10 @@ class MapCommands(commands.Cog):
         await ctx.defer()
         ip = ip_address(ip)
         port = port
-        _server = await GetServer(ip, port)
+        snapshots = self.bot.snapshots
+        _snapshot = snapshots.get(f"{ip}:{port}")
+        # copied so the author below doesn't leak into the shared tracking embed
+        _server = copy.copy(_snapshot.info) if _snapshot else await GetServer(ip, port, self.bot.http_client)
 
         class ButtonView(discord.ui.View):
             def __init__(self):
@@ -46,7 +64,8 @@ class MapCommands(commands.Cog):
             @discord.ui.button(label="Player List", style=discord.ButtonStyle.secondary)
             async def sendplayer(self, _button: discord.ui.Button, _interaction: discord.Interaction):
 
-                _pl = await _server.players()
+                _snapshot = snapshots.get(f"{ip}:{port}")
+                _pl = _snapshot.players if _snapshot else await _server.players()
                 if not _pl:
                     await _interaction.response.send_message("Server doesn't respond", ephemeral=True)
                     return
@@ -70,7 +89,14 @@ class MapCommands(commands.Cog):
         _view = ButtonView()
         _server.set_author(name=ctx.author, icon_url=ctx.author.avatar.url)
 
-        await ctx.respond(embed=_server, view=_view)
+        _files = []
+        _thumbnail = await self.bot.mapimgs.thumbnail(_server.maps) if _server.status else None
+        if _thumbnail:
+            _name = f"{_server.maps.lower()}.jpg"
+            _files.append(discord.File(io.BytesIO(_thumbnail), _name))
+            _server.set_thumbnail(url=f"attachment://{_name}")
+
+        await ctx.respond(embed=_server, view=_view, files=_files)
         await _view.wait()
         _view.disable_all_items()
         try:
@@ -151,7 +177,8 @@ class MapCommands(commands.Cog):
         if not _channel:
             return await ctx.respond("Please specify a tracking channel first")
 
-        serverstatus = await GetServer(ip=ip, port=port)
+        _snapshot = self.bot.snapshots.get(ipport)
+        serverstatus = _snapshot.info if _snapshot else await GetServer(ip=ip, port=port, http=self.bot.http_client)
 
         if ipport in _tracking:
             return await ctx.respond("Given server ip is already on map tracking")
@@ -176,18 +203,7 @@ class MapCommands(commands.Cog):
             _sv_list.append(ipport)
             with open(self.bot.config["path"], "w") as w:
                 json.dump(self.bot.config, w)
-            self.bot.server_task[ipport] = tasks.Loop(
-                sv.servercheck,
-                60,
-                discord.MISSING,
-                discord.MISSING,
-                time=discord.MISSING,
-                count=None,
-                loop=self.bot.loop,
-                reconnect=True,
-            )
-            self.bot.server_task[ipport].start()
-            self.bot.server_task[ipport].get_task().set_name(ipport)
+            self.bot.scheduler.add(sv)
             _logger.info(f"Added new server '{ipport}' to map task")
 
         await ctx.respond(f"Successfully added **{serverstatus.name}** to map tracking")
@@ -213,8 +229,21 @@ class MapCommands(commands.Cog):
     async def update_map(self, ctx: discord.ApplicationContext):
         if ctx.author.id not in self.bot.owner_ids:
             raise commands.NotOwner(f"{ctx.author.name} invoking updatemap")
+        if self._update_task and not self._update_task.done():
+            return await ctx.respond("map list is already being updated")
         await ctx.respond("please wait till i finish updating map list...")
-        await updatemap()
+        self._update_task = asyncio.create_task(self._updatemap(ctx), name="updatemap")
+
+    async def _updatemap(self, ctx: discord.ApplicationContext):
+        _st = datetime.now()
+        try:
+            maps = await updatemap(self.bot.http_client)
+        except Exception as e:
+            _logger.error(f"Failed to update map list: {e}")
+            return await ctx.send_followup("Failed to update map list")
+        if maps:
+            await self.bot.maps.refresh(maps)
+        await ctx.send_followup(f"Map list updated: {len(maps)} maps in {(datetime.now() - _st).seconds}s")
 
     @mapgroup.command(name="find", description="notify a map by selecting map on current db")
     @addhelp(
@@ -224,23 +253,27 @@ class MapCommands(commands.Cog):
         self,
         ctx: discord.ApplicationContext,
         *,
-        map: discord.Option(str, description="map name to notify, auto find, divided by space, length min 5"),
+        map: discord.Option(
+            str,
+            description="map name to notify, auto find, divided by space, length min 5",
+            autocomplete=map_autocomplete,
+        ),
     ):
         await ctx.defer()
 
-        founded_map = []
+        founded_map: t.Dict[str, None] = {}
         invalid_map = []
         for _map in map.split(" "):
             _map: str = _map.lower()
             if len(_map) < 5:
                 invalid_map.append(_map)
                 continue
-            with open("map_list/maplist.txt") as maps:
-                _maps = maps.read()
-                if not re.search(_map, _maps):
-                    invalid_map.append(_map)
-                    continue
-                founded_map.extend([m for m in _maps.split("\n") if re.search(_map, m) and m not in founded_map])
+            _found = self.bot.maps.search(_map)
+            if not _found:
+                _similar = self.bot.maps.fuzzy(_map, 3)
+                invalid_map.append(f"{_map} (did you mean: {', '.join(_similar)}?)" if _similar else _map)
+                continue
+            founded_map.update(dict.fromkeys(_found))
 
         embeds = discord.Embed()
 
@@ -282,7 +315,7 @@ class MapCommands(commands.Cog):
         pattern: str = pattern.strip()
         if re.search("\s", string=pattern):
             return await ctx.respond("pattern must not contain any whitespace")
-        await self.bot.db.insertnotify(ctx.author.id, ctx.author, [pattern.lower()])
+        await self.bot.updatenotify(ctx.author.id, ctx.author, [pattern.lower()])
         await ctx.respond(f"String pattern: **{pattern}** added to notification")
 
     @notify.command(name="list", description="Get your notification list")
@@ -324,7 +357,7 @@ class MapCommands(commands.Cog):
         self,
         ctx: discord.ApplicationContext,
         ip: discord.Option(str, "ip server to get"),
-        map: discord.Option(str, "map name to get"),
+        map: discord.Option(str, "map name to get", autocomplete=map_autocomplete),
     ):
         raise commands.CommandInvokeError("Command is currently on build!")
         await ctx.defer()
@@ -1,11 +1,12 @@
 import asyncio
+import time
 import typing as t
-from datetime import datetime
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
 from ipaddress import IPv4Address
 from itertools import chain
 
 import aiomysql
-import numpy as np
 from pymysql.err import InterfaceError, OperationalError
 
 from enums import *
@@ -15,30 +16,37 @@ from utils import log_exception
 _logger = setlog(__name__)
 
 
+SCHEMA_TABLE = """
+CREATE TABLE IF NOT EXISTS `schema_version` ( 
+    `version` INT NOT NULL , 
+    `applied` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP , 
+    PRIMARY KEY (`version`)
+) ENGINE = InnoDB;
+"""
 GUILD_TABLE = """
-CREATE TABLE `not1x`.`guild_tracking` ( 
+CREATE TABLE IF NOT EXISTS `guild_tracking` ( 
     `id` INT NOT NULL AUTO_INCREMENT , 
     `guild_id` BIGINT NOT NULL , 
     `channel_id` BIGINT NOT NULL DEFAULT '0' , 
-    `tracking_ip` VARCHAR NOT NULL DEFAULT '0' , 
+    `tracking_ip` VARCHAR(255) NOT NULL DEFAULT '0' , 
     `message_id` BIGINT NOT NULL DEFAULT '0' , 
     PRIMARY KEY (`id`)
 ) ENGINE = InnoDB;
 """
 USER_TABLE = """
-CREATE TABLE `not1x`.`user_data` ( 
+CREATE TABLE IF NOT EXISTS `user_data` ( 
     `id` INT NOT NULL AUTO_INCREMENT , 
     `userid` BIGINT NOT NULL , 
     `name` VARCHAR(1024) NOT NULL , 
-    `notified_maps` VARCHAR NOT NULL , 
+    `notified_maps` VARCHAR(255) NOT NULL , 
     PRIMARY KEY (`id`)
 ) ENGINE = InnoDB;
 """
-SERVER_INFO = """"
-CREATE TABLE `not1x`.`server_info` ( 
+SERVER_INFO = """
+CREATE TABLE IF NOT EXISTS `server_info` ( 
     `id` INT NOT NULL AUTO_INCREMENT , 
-    `tracking_ip` VARCHAR NOT NULL , 
-    `map` VARCHAR NOT NULL , 
+    `tracking_ip` VARCHAR(255) NOT NULL , 
+    `map` VARCHAR(255) NOT NULL , 
     `date` DATE NOT NULL , 
     `lastplayed` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP , 
     `playtime` INT NOT NULL , 
@@ -48,7 +56,7 @@ CREATE TABLE `not1x`.`server_info` (
 ) ENGINE = InnoDB;
 """
 SERVER_DATA = """
-CREATE TABLE `not1x`.`server_data` ( 
+CREATE TABLE IF NOT EXISTS `server_data` ( 
     `id` INT NOT NULL AUTO_INCREMENT , 
     `server_ip` VARCHAR(255) NOT NULL , 
     `last_map` VARCHAR(255) NOT NULL , 
@@ -56,6 +64,113 @@ CREATE TABLE `not1x`.`server_data` (
     PRIMARY KEY (`id`)
 ) ENGINE = InnoDB;
 """
+SERVER_DAILY = """
+CREATE TABLE IF NOT EXISTS `server_daily` ( 
+    `tracking_ip` VARCHAR(255) NOT NULL , 
+    `date` DATE NOT NULL , 
+    `playtime` INT NOT NULL DEFAULT '0' , 
+    `played` INT NOT NULL DEFAULT '0' , 
+    `player_sum` BIGINT NOT NULL DEFAULT '0' , 
+    `samples` INT NOT NULL DEFAULT '0' , 
+    `peak_players` INT NOT NULL DEFAULT '0' , 
+    PRIMARY KEY (`tracking_ip`, `date`)
+) ENGINE = InnoDB;
+"""
+# (table, key, merge statements, ddl), a migration step adding `key` unless it exists,
+# the merge statements run in one transaction before the ddl
+KeyStep = t.Tuple[str, str, t.List[str], str]
+# unique keys the record_tick upserts rely on, duplicates are merged before adding them
+UPSERT_KEYS: t.List[KeyStep] = [
+    (
+        "server_data",
+        "server_data_ip",
+        [
+            """
+            DELETE d1 FROM `server_data` d1 JOIN `server_data` d2
+            ON d1.`server_ip` = d2.`server_ip` AND d1.`id` < d2.`id`
+            """
+        ],
+        "ALTER TABLE `server_data` ADD UNIQUE KEY `server_data_ip` (`server_ip`)",
+    ),
+    (
+        "server_info",
+        "server_info_tick",
+        [
+            # every old row is one map change, so merged rows keep the sum of `played` and `playtime`
+            """
+            UPDATE `server_info` s JOIN (
+                SELECT MIN(`id`) AS `id`, SUM(`playtime`) AS `playtime`, SUM(`played`) AS `played`,
+                ROUND(COALESCE(SUM(`average_players` * `playtime`) / NULLIF(SUM(`playtime`), 0), AVG(`average_players`)))
+                AS `average_players`, MAX(`lastplayed`) AS `lastplayed`
+                FROM `server_info` GROUP BY `tracking_ip`, `map`, `date` HAVING COUNT(*) > 1
+            ) d ON s.`id` = d.`id`
+            SET s.`playtime` = d.`playtime`, s.`played` = d.`played`,
+            s.`average_players` = d.`average_players`, s.`lastplayed` = d.`lastplayed`
+            """,
+            """
+            DELETE s1 FROM `server_info` s1 JOIN `server_info` s2
+            ON s1.`tracking_ip` = s2.`tracking_ip` AND s1.`map` = s2.`map` AND s1.`date` = s2.`date`
+            AND s1.`id` > s2.`id`
+            """,
+        ],
+        "ALTER TABLE `server_info` ADD UNIQUE KEY `server_info_tick` (`tracking_ip`, `map`, `date`)",
+    ),
+]
+# (version, steps), applied in order by connection.migrate and never edited once released,
+# every step must be safe to repeat since a failed version is retried from its first step
+MIGRATIONS: t.List[t.Tuple[int, t.List[t.Union[str, KeyStep]]]] = [
+    (1, [GUILD_TABLE, USER_TABLE, SERVER_INFO, SERVER_DATA]),
+    (
+        2,
+        [
+            *UPSERT_KEYS,
+            (
+                "server_info",
+                "server_info_lastplayed",
+                [],
+                "ALTER TABLE `server_info` ADD INDEX `server_info_lastplayed` (`tracking_ip`, `lastplayed`)",
+            ),
+            (
+                "guild_tracking",
+                "guild_tracking_ip",
+                [],
+                "ALTER TABLE `guild_tracking` ADD INDEX `guild_tracking_ip` (`tracking_ip`)",
+            ),
+            (
+                "guild_tracking",
+                "guild_tracking_guild",
+                [],
+                "ALTER TABLE `guild_tracking` ADD INDEX `guild_tracking_guild` (`guild_id`, `tracking_ip`)",
+            ),
+            (
+                "user_data",
+                "user_data_user",
+                [],
+                "ALTER TABLE `user_data` ADD INDEX `user_data_user` (`userid`, `notified_maps`(191))",
+            ),
+        ],
+    ),
+    (
+        3,
+        [
+            SERVER_DAILY,
+            (
+                "server_info",
+                "server_info_date",
+                [],
+                "ALTER TABLE `server_info` ADD INDEX `server_info_date` (`tracking_ip`, `date`)",
+            ),
+            # seed the rollup from existing history, playtime/average are per map so the backfill is approximate,
+            # days already seeded by an interrupted run are skipped
+            """
+            INSERT IGNORE INTO `server_daily` (`tracking_ip`, `date`, `playtime`, `played`, `player_sum`, `samples`, `peak_players`)
+            SELECT `tracking_ip`, `date`, SUM(`playtime`), SUM(`played`), SUM(`average_players` * `playtime`),
+            SUM(`playtime`), MAX(`average_players`)
+            FROM `server_info` GROUP BY `tracking_ip`, `date`
+            """,
+        ],
+    ),
+]
 loop = asyncio.get_event_loop()
 
 
@@ -78,19 +193,152 @@ class iterdb:
 class connection:
     def __init__(self, data: dict) -> None:
         self.__data = data
+        self._pool: aiomysql.Pool | None = None
+        self._pool_lock = asyncio.Lock()
+        self._ping_interval: int = data.get("ping_interval", 60)
+
+    async def connect(self) -> aiomysql.Pool:
+        """
+        create the shared connection pool, called lazily on first query
+        """
+        async with self._pool_lock:
+            if self._pool is None or self._pool.closed:
+                self._pool = await aiomysql.create_pool(
+                    host=self.__data["host"],
+                    port=self.__data["port"],
+                    user=self.__data["user"],
+                    password=self.__data["password"],
+                    db=self.__data["db"],
+                    minsize=self.__data.get("minsize", 1),
+                    maxsize=self.__data.get("maxsize", 10),
+                    pool_recycle=self.__data.get("pool_recycle", 3600),
+                    autocommit=True,
+                )
+                _logger.info("Database pool created")
+        return self._pool
+
+    async def close(self):
+        if self._pool is None:
+            return
+        self._pool.close()
+        await self._pool.wait_closed()
+        self._pool = None
+        _logger.info("Database pool closed")
+
+    @asynccontextmanager
+    async def acquire(self) -> t.AsyncIterator[aiomysql.Connection]:
+        pool = self._pool if self._pool is not None and not self._pool.closed else await self.connect()
+        async with pool.acquire() as con:
+            con: aiomysql.Connection
+            _last = getattr(con, "_last_used", None)
+            if _last is not None and time.monotonic() - _last > self._ping_interval:
+                await con.ping(reconnect=True)
+            try:
+                yield con
+            finally:
+                con._last_used = time.monotonic()
+
+    @asynccontextmanager
+    async def transaction(self) -> t.AsyncIterator[aiomysql.Cursor]:
+        """
+        run every statement executed on the yielded cursor in a single transaction
+        """
+        async with self.acquire() as con:
+            await con.begin()
+            async with con.cursor() as cur:
+                cur: aiomysql.Cursor
+                try:
+                    yield cur
+                except BaseException:
+                    await con.rollback()
+                    raise
+                else:
+                    await con.commit()
+
+    async def _haskey(self, cur: aiomysql.Cursor, table: str, key: str) -> bool:
+        await cur.execute(
+            "SELECT 1 FROM `information_schema`.`STATISTICS` "
+            "WHERE `TABLE_SCHEMA` = DATABASE() AND `TABLE_NAME` = %s AND `INDEX_NAME` = %s LIMIT 1",
+            (table, key),
+        )
+        return bool(await cur.fetchone())
+
+    async def _addkey(self, con: aiomysql.Connection, cur: aiomysql.Cursor, step: KeyStep):
+        table, key, merge, ddl = step
+        if await self._haskey(cur, table, key):
+            return
+        # merge in one transaction so a failed run never merges twice
+        await con.begin()
+        try:
+            for statement in merge:
+                await cur.execute(statement)
+        except BaseException:
+            await con.rollback()
+            raise
+        await con.commit()
+        await cur.execute(ddl)
+        _logger.info(f"Added key {key} on {table}")
+
+    async def migrate(self) -> bool:
+        """
+        bring the schema up to the latest MIGRATIONS version, safe to run on every startup
+        """
+        try:
+            async with self.acquire() as con:
+                async with con.cursor() as cur:
+                    cur: aiomysql.Cursor
+                    await cur.execute("SELECT GET_LOCK('not1x_migrate', 60)")
+                    (locked,) = await cur.fetchone()
+                    if locked != 1:
+                        _logger.error("Could not get the db migration lock")
+                        return False
+                    try:
+                        await cur.execute(SCHEMA_TABLE)
+                        await cur.execute("SELECT COALESCE(MAX(`version`), 0) FROM `schema_version`")
+                        (current,) = await cur.fetchone()
+                        for version, steps in MIGRATIONS:
+                            if version <= current:
+                                continue
+                            for step in steps:
+                                if isinstance(step, str):
+                                    await cur.execute(step)
+                                else:
+                                    await self._addkey(con, cur, step)
+                            await cur.execute("INSERT INTO `schema_version` (`version`) VALUES (%s)", (version,))
+                            _logger.info(f"Applied db migration {version}")
+                    finally:
+                        await cur.execute("SELECT RELEASE_LOCK('not1x_migrate')")
+        except Exception as e:
+            log_exception(e, base_err)
+            _logger.error("Failed to migrate database schema")
+            return False
+        return True
+
+    async def stream(self, query: str, *args, size: int = 500) -> t.AsyncIterator[t.Tuple]:
+        """
+        iterate query rows with a server-side cursor, `size` rows are held in memory at a time
+        """
+        async with self.acquire() as con:
+            async with con.cursor(aiomysql.SSCursor) as cur:
+                cur: aiomysql.SSCursor
+                try:
+                    await cur.execute(query, *args)
+                except Exception as e:
+                    log_exception(e, base_err)
+                    _logger.error("Connection to db was failed!")
+                    return
+                while True:
+                    rows = await cur.fetchmany(size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield row
 
     async def execute(
         self, query: str, *args, fetch: bool = False, fetchall: bool = False, res: bool = True, commit: bool = False
     ) -> t.Tuple | None:
         _res = None
-        async with aiomysql.connect(
-            host=self.__data["host"],
-            port=self.__data["port"],
-            user=self.__data["user"],
-            password=self.__data["password"],
-            db=self.__data["db"],
-        ) as con:
-            con: aiomysql.Connection
+        async with self.acquire() as con:
             async with con.cursor() as cur:
                 cur: aiomysql.Cursor
                 try:
@@ -117,43 +365,35 @@ class connection:
             m: str
             yield m
 
-    async def insertnotify(self, userid: int, name: str, maps: t.List[str], *, delete: bool = False):
-        r = await self.execute(
-            "SELECT userid FROM user_data WHERE userid = %s", (userid), fetch=True, fetchall=False, res=True
-        )
-        q = "INSERT INTO `user_data`(`userid`, `name`, `notified_maps`) VALUES (%s, %s, %s)"
-        if r:
-            async for map in iterdb(maps):
+    async def insertnotify(self, userid: int, name: str, maps: t.List[str], *, delete: bool = False) -> bool:
+        if not maps:
+            return True
+        try:
+            async with self.transaction() as cur:
                 if delete:
-                    q = "DELETE FROM `user_data` WHERE `notified_maps` = %s AND `userid` = %s"
-                await self.execute(
-                    q,
-                    (str(userid), str(name), str(map)),
-                    commit=True,
-                    res=False,
-                    fetch=False,
-                )
-            _logger.info(f"Successfully updated notify for {name}")
-        else:
-            async for map in iterdb(maps):
-                await self.execute(
-                    q,
-                    (str(userid), str(name), str(map)),
-                    commit=True,
-                    res=False,
-                    fetch=False,
-                )
-            _logger.info(f"Successfully added new user {name} to db")
+                    q = "DELETE FROM `user_data` WHERE `userid` = %s AND `notified_maps` IN ({})".format(
+                        ", ".join(["%s"] * len(maps))
+                    )
+                    await cur.execute(q, (userid, *maps))
+                else:
+                    await cur.executemany(
+                        "INSERT INTO `user_data`(`userid`, `name`, `notified_maps`) VALUES (%s, %s, %s)",
+                        [(str(userid), str(name), str(map)) for map in maps],
+                    )
+        except Exception as e:
+            log_exception(e, base_err)
+            _logger.error(f"Failed to update notify for {name}")
+            return False
+        _logger.info(f"Successfully {'deleted' if delete else 'added'} {len(maps)} notify for {name}")
+        return True
 
     async def fetchuser(self):
-        r = await self.execute("SELECT * FROM `user_data`", fetch=True, fetchall=True, res=True)
-        for d in r:
+        async for d in self.stream("SELECT * FROM `user_data`"):
             d: t.Tuple[int, int, str, str]
             yield d
 
     async def fetchuserid(self):
-        r = await self.execute("SELECT `userid` FROM `user_data`", fetch=True, fetchall=True, res=True)
-        for d in np.unique(r):
+        async for (d,) in self.stream("SELECT DISTINCT `userid` FROM `user_data`"):
             d: int
             yield d
 
@@ -162,10 +402,7 @@ class connection:
         return r
 
     async def fetchip(self, ip: str):
-        r = await self.execute(
-            "SELECT * FROM `guild_tracking` WHERE `tracking_ip` = %s", (ip), fetch=True, fetchall=True, res=True
-        )
-        for d in r:
+        async for d in self.stream("SELECT * FROM `guild_tracking` WHERE `tracking_ip` = %s", (ip)):
             d: t.Tuple[int, int, int, str, int]
             yield d
 
@@ -268,22 +505,132 @@ class connection:
         q = "UPDATE `server_info` SET `average_players` = %s WHERE `tracking_ip` = %s AND `map` = %s AND `date` = %s"
         await self.execute(q, (player, ip, map, date), commit=True)
 
-    async def getserverdata(self):
-        r = await self.execute("SELECT * FROM `server_info`", fetch=True, fetchall=True)
-        return r
-
-    async def fetchserverdata(self, ip: str) -> t.List[server_info]:
+    async def record_tick(
+        self,
+        ip: str,
+        map: str,
+        date: datetime,
+        players: int,
+        playtime: int,
+        *,
+        newmap: bool = False,
+        timeplay: int = 0,
+    ) -> bool:
         """
-        fetch server data from db
-            return tuple(id, ip, map, date, lastplayed, playtime, played, average_players)
+        write one map task tick in a single transaction
+            newmap: map has changed, bump `played` and store `timeplay` as the new map start time
+            playtime and average of a map played earlier that day are kept, flushstats adds to them
+        """
+        info = (
+            "INSERT INTO `server_info` (`tracking_ip`, `map`, `date`, `playtime`, `played`, `average_players`) "
+            "VALUES (%s, %s, %s, %s, 1, %s) ON DUPLICATE KEY UPDATE "
+            + ("`played` = `played` + 1, `lastplayed` = CURRENT_TIMESTAMP" if newmap else "`played` = `played`")
+        )
+        lastmap = (
+            "INSERT INTO `server_data` (`server_ip`, `last_map`, `time_play`) VALUES (%s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE `last_map` = VALUES(`last_map`), `time_play` = VALUES(`time_play`)"
+        )
+        daily = (
+            "INSERT INTO `server_daily` (`tracking_ip`, `date`, `played`) VALUES (%s, %s, 1) "
+            "ON DUPLICATE KEY UPDATE `played` = `played` + 1"
+        )
+        try:
+            async with self.transaction() as cur:
+                if newmap:
+                    await cur.execute(lastmap, (ip, map, timeplay))
+                    await cur.execute(daily, (ip, date))
+                await cur.execute(info, (ip, map, date, playtime, players))
+        except Exception as e:
+            log_exception(e, base_err)
+            _logger.error(f"Failed to record tick for {ip}")
+            return False
+        return True
+
+    async def flushstats(
+        self,
+        rows: t.List[t.Tuple[str, str, str, int, int]],
+        daily: t.Optional[t.List[t.Tuple[str, str, int, int, int, int]]] = None,
+    ) -> bool:
+        """
+        bulk write buffered server_info stats
+            rows: server_info increments (ip, map, date, playtime, average_players of the new samples)
+            daily: server_daily increments (ip, date, playtime, player_sum, samples, peak_players)
+        """
+        if not rows:
+            return True
+        # the average is weighted by playtime, a minute of playtime is one sample,
+        # it is assigned before `playtime` so it still sees the old value
+        q = (
+            "INSERT INTO `server_info` (`tracking_ip`, `map`, `date`, `playtime`, `played`, `average_players`) "
+            "VALUES (%s, %s, %s, %s, 1, %s) ON DUPLICATE KEY UPDATE "
+            "`average_players` = ROUND(COALESCE((`average_players` * `playtime` + VALUES(`average_players`) * "
+            "VALUES(`playtime`)) / NULLIF(`playtime` + VALUES(`playtime`), 0), VALUES(`average_players`))), "
+            "`playtime` = `playtime` + VALUES(`playtime`)"
+        )
+        dq = (
+            "INSERT INTO `server_daily` (`tracking_ip`, `date`, `playtime`, `player_sum`, `samples`, `peak_players`) "
+            "VALUES (%s, %s, %s, %s, %s, %s) ON DUPLICATE KEY UPDATE "
+            "`playtime` = `playtime` + VALUES(`playtime`), `player_sum` = `player_sum` + VALUES(`player_sum`), "
+            "`samples` = `samples` + VALUES(`samples`), `peak_players` = GREATEST(`peak_players`, VALUES(`peak_players`))"
+        )
+        try:
+            async with self.transaction() as cur:
+                await cur.executemany(q, rows)
+                if daily:
+                    await cur.executemany(dq, daily)
+        except Exception as e:
+            log_exception(e, base_err)
+            _logger.error(f"Failed to flush {len(rows)} server stats")
+            return False
+        return True
+
+    async def getsummary(self, ip: str, days: int) -> t.List[ServerHistory]:
+        """
+        per map stats of the last `days` days, most played first
         """
         r = await self.execute(
-            "SELECT * FROM `server_info` WHERE `tracking_ip` = %s ORDER BY `lastplayed` DESC",
-            (ip),
+            "SELECT `map`, SUM(`playtime`), SUM(`played`), ROUND(AVG(`average_players`), 2), MAX(`lastplayed`) "
+            "FROM `server_info` WHERE `tracking_ip` = %s AND `date` >= %s GROUP BY `map` ORDER BY SUM(`playtime`) DESC",
+            (ip, (datetime.now() - timedelta(days=days - 1)).date()),
             fetch=True,
             fetchall=True,
         )
-        return [server_info(*s) for s in r]
+        return [
+            ServerHistory(Map=m, Play_Time=int(pt), Played=int(pl), Average_Player=float(avg), Last_Played=lp)
+            for m, pt, pl, avg, lp in r or []
+        ]
+
+    async def getdailysummary(self, ip: str, days: int) -> server_summary:
+        """
+        server totals of the last `days` days from the server_daily rollup
+        """
+        r = await self.execute(
+            "SELECT COUNT(*), COALESCE(SUM(`playtime`), 0), COALESCE(SUM(`played`), 0), "
+            "COALESCE(SUM(`player_sum`) / NULLIF(SUM(`samples`), 0), 0), COALESCE(MAX(`peak_players`), 0) "
+            "FROM `server_daily` WHERE `tracking_ip` = %s AND `date` >= %s",
+            (ip, (datetime.now() - timedelta(days=days - 1)).date()),
+            fetch=True,
+        )
+        if not r:
+            return server_summary(0, 0, 0, 0.0, 0)
+        return server_summary(int(r[0]), int(r[1]), int(r[2]), round(float(r[3]), 2), int(r[4]))
+
+    async def getserverdata(self):
+        async for d in self.stream("SELECT * FROM `server_info`"):
+            yield server_info(*d)
+
+    async def fetchserverdata(self, ip: str, *, limit: t.Optional[int] = None) -> t.List[server_info]:
+        """
+        fetch server data from db, newest first
+            limit: max rows to fetch
+            return tuple(id, ip, map, date, lastplayed, playtime, played, average_players)
+        """
+        q = "SELECT * FROM `server_info` WHERE `tracking_ip` = %s ORDER BY `lastplayed` DESC"
+        args: t.List[t.Any] = [ip]
+        if limit is not None:
+            q += " LIMIT %s"
+            args.append(limit)
+        return [server_info(*s) async for s in self.stream(q, args)]
 
     async def getlastmap(self, ip: str) -> t.Union[str, MapEnum.UNKOWN.value]:
         r = await self.execute(
@@ -296,6 +643,21 @@ class connection:
         )
         return list(chain.from_iterable(r))[0] if r else MapEnum.UNKOWN
 
+    async def getlaststate(self, ip: str) -> t.Optional[t.Tuple[t.Union[str, MapEnum], int]]:
+        """
+        last map and map start time of a server in one query
+            return None when the query failed, (MapEnum.UNKOWN, now) when the server has no row yet
+        """
+        r = await self.execute(
+            "SELECT `last_map`, `time_play` FROM `server_data` WHERE `server_ip` = %s",
+            (ip),
+            fetch=True,
+            fetchall=True,
+        )
+        if r is None:
+            return None
+        return (r[0][0], round(r[0][1])) if r else (MapEnum.UNKOWN, round(datetime.now().timestamp()))
+
     async def getmapdata(self, ip: str, map: str):
         r = await self.execute(
             "SELECT * FROM `server_info` WHERE `tracking_ip` = %s AND `map` = %s",
@@ -63,6 +63,14 @@ class server_info(t.NamedTuple):
     average_players: int
 
 
+class server_summary(t.NamedTuple):
+    days: int
+    playtime: int
+    played: int
+    average_players: float
+    peak_players: int
+
+
 class user_data(t.NamedTuple):
     id: int
     userid: int
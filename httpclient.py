@@ -0,0 +1,81 @@
+import asyncio
+import typing as t
+
+import aiohttp
+from multidict import CIMultiDictProxy
+
+from logs import setlog
+
+_logger = setlog(__name__)
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class HTTPResponse(t.NamedTuple):
+    status: int
+    headers: CIMultiDictProxy
+    body: bytes
+    url: str
+
+    def text(self, encoding: str = "utf-8") -> str:
+        return self.body.decode(encoding, errors="replace")
+
+
+class HTTPClient:
+    """
+    bot-wide aiohttp session, every outbound scrape goes through here
+
+    connections are pooled and kept alive, requests failing with a connection error,
+    timeout or retryable status are retried with exponential backoff
+    """
+
+    def __init__(
+        self,
+        *,
+        limit: int = 20,
+        limit_per_host: int = 4,
+        timeout: float = 15,
+        retries: int = 2,
+        backoff: float = 0.5,
+    ) -> None:
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self._session: aiohttp.ClientSession | None = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.limit, limit_per_host=self.limit_per_host, ttl_dns_cache=300
+                ),
+                timeout=self.timeout,
+                headers={"User-Agent": "not1x"},
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def request(self, method: str, url: str, **kwargs: t.Any) -> HTTPResponse:
+        for attempt in range(self.retries + 1):
+            last = attempt >= self.retries
+            try:
+                async with self.session.request(method, url, **kwargs) as resp:
+                    if resp.status in RETRY_STATUS and not last:
+                        _logger.debug(f"{method} {url} returned {resp.status}, retrying")
+                    else:
+                        return HTTPResponse(resp.status, resp.headers, await resp.read(), str(resp.url))
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if last:
+                    raise
+                _logger.debug(f"{method} {url} failed with {e!r}, retrying")
+            await asyncio.sleep(self.backoff * 2**attempt)
+
+    async def get(self, url: str, **kwargs: t.Any) -> HTTPResponse:
+        return await self.request("GET", url, **kwargs)
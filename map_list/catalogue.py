@@ -0,0 +1,140 @@
+import asyncio
+import bisect
+import typing as t
+from collections import Counter, OrderedDict
+
+from logs import setlog
+
+_logger = setlog(__name__)
+
+
+class _Index(t.NamedTuple):
+    maps: t.Tuple[str, ...]
+    trigrams: t.Dict[str, t.FrozenSet[int]]
+    completions: t.OrderedDict[str, t.List[str]]
+
+
+def _trigrams(name: str) -> t.Set[str]:
+    return {name[i : i + 3] for i in range(len(name) - 2)}
+
+
+class MapCatalogue:
+    """
+    maplist.txt loaded once into a sorted lowercase list with a trigram index
+
+    searches are plain substring/prefix lookups, user input is never compiled as a regex,
+    `reload` and `refresh` build a new index and swap it in one assignment
+    """
+
+    def __init__(self, path: str = "map_list/maplist.txt", cache_size: int = 1024) -> None:
+        self.path = path
+        self.cache_size = cache_size
+        self._index = _Index((), {}, OrderedDict())
+        self.reload()
+
+    def __len__(self) -> int:
+        return len(self._index.maps)
+
+    @property
+    def maps(self) -> t.Tuple[str, ...]:
+        return self._index.maps
+
+    def _build(self, maps: t.Optional[t.Iterable[str]] = None) -> _Index:
+        if maps is None:
+            try:
+                with open(self.path, "r") as f:
+                    maps = f.read().split("\n")
+            except FileNotFoundError:
+                _logger.warning(f"{self.path} not found, map catalogue is empty")
+                maps = []
+        _maps = tuple(sorted({m.strip().lower() for m in maps if m.strip()}))
+        postings: t.Dict[str, t.Set[int]] = {}
+        for num, m in enumerate(_maps):
+            for tri in _trigrams(m):
+                postings.setdefault(tri, set()).add(num)
+        return _Index(_maps, {k: frozenset(v) for k, v in postings.items()}, OrderedDict())
+
+    def reload(self, maps: t.Optional[t.Iterable[str]] = None):
+        self._index = self._build(maps)
+        _logger.info(f"Loaded {len(self._index.maps)} maps to catalogue")
+
+    async def refresh(self, maps: t.Optional[t.Iterable[str]] = None):
+        """
+        `reload` from the event loop, the index is built in the default executor and only swapped on the loop
+        """
+        index = await asyncio.get_running_loop().run_in_executor(None, self._build, maps)
+        self._index = index
+        _logger.info(f"Loaded {len(index.maps)} maps to catalogue")
+
+    def prefix(self, token: str, limit: t.Optional[int] = None) -> t.List[str]:
+        maps = self._index.maps
+        token = token.lower()
+        res = []
+        for num in range(bisect.bisect_left(maps, token), len(maps)):
+            if not maps[num].startswith(token) or (limit is not None and len(res) >= limit):
+                break
+            res.append(maps[num])
+        return res
+
+    def search(self, token: str, limit: t.Optional[int] = None) -> t.List[str]:
+        """
+        every map containing `token`, alphabetically
+        """
+        index = self._index
+        token = token.lower()
+        if len(token) < 3:
+            found = (m for m in index.maps if token in m)
+        else:
+            postings = sorted((index.trigrams.get(tri, frozenset()) for tri in _trigrams(token)), key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+            found = (index.maps[num] for num in sorted(candidates) if token in index.maps[num])
+        res = []
+        for m in found:
+            if limit is not None and len(res) >= limit:
+                break
+            res.append(m)
+        return res
+
+    def fuzzy(self, token: str, limit: int = 5) -> t.List[str]:
+        """
+        maps sharing the most trigrams with `token`, for misspelled names
+        """
+        index = self._index
+        grams = _trigrams(token.lower())
+        if not grams:
+            return []
+        scores: t.Counter[int] = Counter()
+        for tri in grams:
+            scores.update(index.trigrams.get(tri, ()))
+        ranked = sorted(
+            scores.items(),
+            key=lambda s: (-s[1] / (len(grams) + len(index.maps[s[0]]) - 2 - s[1]), index.maps[s[0]]),
+        )
+        return [index.maps[num] for num, _ in ranked[:limit]]
+
+    def complete(self, token: str, limit: int = 25) -> t.List[str]:
+        """
+        ranked suggestions for a partially typed map: prefix matches, then substring, then fuzzy
+            results are cached per token until the next reload
+        """
+        index = self._index
+        token = token.strip().lower()
+        if token in index.completions:
+            index.completions.move_to_end(token)
+            return index.completions[token]
+        res = dict.fromkeys(self.prefix(token, limit))
+        if len(res) < limit and token:
+            for m in sorted(self.search(token), key=lambda m: (m.find(token), len(m))):
+                res.setdefault(m)
+                if len(res) >= limit:
+                    break
+        if len(res) < limit and len(token) >= 3:
+            for m in self.fuzzy(token, limit):
+                res.setdefault(m)
+                if len(res) >= limit:
+                    break
+        completions = list(res)[:limit]
+        index.completions[token] = completions
+        if len(index.completions) > self.cache_size:
+            index.completions.popitem(last=False)
+        return completions
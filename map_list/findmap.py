@@ -1,11 +1,12 @@
 import asyncio
-import re
+import json
+import os
 import typing as t
+from html.parser import HTMLParser
 from itertools import chain
+from urllib.parse import unquote
 
-import httpx
-from bs4 import BeautifulSoup as bs
-
+from httpclient import HTTPClient
 from logs import setlog
 
 _logger = setlog(__name__)
@@ -14,29 +15,104 @@ MAPSOURCE = {
     "zeddys": "http://sgfastdl.streamline-servers.com/fastdl/Zeddy/maps/",
     "gfl": "https://fastdl.gflclan.com/csgo/maps/",
 }
+MAPLIST = "map_list/maplist.txt"
+SOURCESTATE = "map_list/sources.json"
 
 
-def parser(site: httpx.Response):
-    scrap = bs(site.read(), "html.parser")
-    maps = []
-    for _map in scrap.find_all(name="a"):
-        _map = _map["href"]
-        if re.search("bsp", _map) and re.search("bz2", _map):
-            if re.search("/", _map):
-                _map = _map.split("/")[-1]
-            _mapname: str = _map.split(".")[0]
-            maps.append(_mapname.lower())
-    return maps
+class _MapLinkParser(HTMLParser):
+    """
+    collects map names from the anchors of a fastdl directory listing as it is fed
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.maps: t.List[str] = []
+
+    def handle_starttag(self, tag: str, attrs: t.List[t.Tuple[str, str | None]]):
+        if tag != "a":
+            return
+        _map = next((v for k, v in attrs if k == "href"), None) or ""
+        if "bsp" in _map and "bz2" in _map:
+            _mapname = unquote(_map.split("/")[-1]).split(".")[0]
+            self.maps.append(_mapname.lower())
+
+
+def parser(site: bytes):
+    _parser = _MapLinkParser()
+    _parser.feed(site.decode("utf-8", errors="replace"))
+    _parser.close()
+    return _parser.maps
+
 
+def _write_atomic(path: str, content: str):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(content)
+    os.replace(tmp, path)
 
-async def updatemap():
-    maps = []
+
+def _load_state() -> t.Dict[str, dict]:
+    try:
+        with open(SOURCESTATE, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        _logger.warning(f"Failed to load map source state: {e}")
+        return {}
+
+
+async def _fetch_source(http: HTTPClient, name: str, url: str, state: dict) -> dict:
+    headers = {}
+    if state.get("etag"):
+        headers["If-None-Match"] = state["etag"]
+    if state.get("last_modified"):
+        headers["If-Modified-Since"] = state["last_modified"]
+    resp = await http.get(url, headers=headers)
+    if resp.status == 304:
+        _logger.info(f"Map source {name} unchanged")
+        return state
+    if resp.status != 200:
+        raise ValueError(f"Map source {name} returned {resp.status}")
+    maps = await asyncio.get_running_loop().run_in_executor(None, parser, resp.body)
+    old, new = set(state.get("maps", [])), set(maps)
+    _logger.info(f"Map source {name}: {len(new)} maps, +{len(new - old)} -{len(old - new)}")
+    if new - old:
+        _logger.debug(f"Map source {name} added: {sorted(new - old)}")
+    if old - new:
+        _logger.debug(f"Map source {name} removed: {sorted(old - new)}")
+    return {
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+        "maps": sorted(new),
+    }
+
+
+async def updatemap(http: HTTPClient) -> t.List[str]:
+    """
+    refresh maplist.txt from every MAPSOURCE concurrently, unchanged sources are skipped with conditional requests
+        a failing source keeps its last known maps, without them nothing is written and the error is raised
+        return the new map list
+    """
     loop = asyncio.get_running_loop()
-    async with httpx.AsyncClient() as client:
-        for k in MAPSOURCE:
-            resp = await client.get(MAPSOURCE[k])
-            res = await loop.run_in_executor(None, parser, resp)
-            maps.append(res)
-    maps = sorted(list(dict.fromkeys(chain.from_iterable(maps)).keys()))
-    with open("map_list/maplist.txt", "w+") as f:
-        f.write("\n".join(maps))
+    state = await loop.run_in_executor(None, _load_state)
+    results = await asyncio.gather(
+        *[_fetch_source(http, k, MAPSOURCE[k], state.get(k, {})) for k in MAPSOURCE], return_exceptions=True
+    )
+    for k, res in zip(MAPSOURCE, results):
+        if not isinstance(res, Exception):
+            continue
+        _logger.error(f"Failed to update map source {k}: {res!r}")
+        if not state.get(k, {}).get("maps"):
+            # maplist.txt would silently lose every map of this source
+            raise res
+    for k, res in zip(MAPSOURCE, results):
+        if not isinstance(res, Exception):
+            state[k] = res
+    maps = sorted(dict.fromkeys(chain.from_iterable(state.get(k, {}).get("maps", []) for k in MAPSOURCE)).keys())
+    if not maps:
+        _logger.warning("No map found from any source, map list is not updated")
+        return maps
+    await loop.run_in_executor(None, _write_atomic, MAPLIST, "\n".join(maps))
+    await loop.run_in_executor(None, _write_atomic, SOURCESTATE, json.dumps(state))
+    return maps
@@ -1,20 +1,165 @@
+from __future__ import annotations
+
 import asyncio
-import re
+import io
+import os
+import typing as t
+from html.parser import HTMLParser
+from pathlib import Path
+from urllib.parse import unquote, urljoin
+
+from PIL import Image
+
+from logs import setlog
+from tasks.create_task import CustomTask
+from utils import AsyncTTLCache
+
+if t.TYPE_CHECKING:
+    import not1x
+
+_logger = setlog(__name__)
+
+MAPIMGS = "https://vauff.com/mapimgs/"
+IMAGE_EXT = (".jpg", ".jpeg", ".png", ".webp")
+# backoff of a failed index refresh, seconds
+RETRY_MIN = 60
+RETRY_MAX = 1800
+
+
+class _ImageLinkParser(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__()
+        self.images: t.Dict[str, str] = {}
+
+    def handle_starttag(self, tag: str, attrs: t.List[t.Tuple[str, str | None]]):
+        if tag != "a":
+            return
+        href = next((v for k, v in attrs if k == "href"), None) or ""
+        if not href.startswith("/mapimgs/ze_"):
+            return
+        name = unquote(href.rstrip("/").split("/")[-1]).lower()
+        if name.endswith(IMAGE_EXT):
+            name = name.rsplit(".", 1)[0]
+        self.images.setdefault(name, urljoin(MAPIMGS, href))
+
+
+def parse_index(content: bytes) -> t.Dict[str, str]:
+    _parser = _ImageLinkParser()
+    _parser.feed(content.decode("utf-8", errors="replace"))
+    _parser.close()
+    return _parser.images
+
+
+class MapImages:
+    """
+    index of ze_ map images on vauff.com/mapimgs with a bounded on-disk cache of thumbnails
+
+    nothing is fetched until `start`, the index is refreshed every `refresh_hours` and retried with backoff on failure,
+    recently sent thumbnails are kept in memory and concurrent requests of the same map share one download
+    """
+
+    def __init__(
+        self,
+        bot: not1x.Bot,
+        cache_dir: str = "map_list/thumbnails",
+        max_files: int = 200,
+        size: t.Tuple[int, int] = (320, 180),
+        refresh_hours: float = 24,
+    ) -> None:
+        self.bot = bot
+        self.cache_dir = Path(cache_dir)
+        self.max_files = max_files
+        self.size = tuple(size)
+        self._images: t.Dict[str, str] = {}
+        self.refresh = refresh_hours * 3600
+        self._retry = RETRY_MIN
+        self._thumbnails = AsyncTTLCache(self.refresh, maxsize=32)
+        self._task = CustomTask(bot, self.index, self.refresh, name="MapImages")
+
+    def __contains__(self, map: str) -> bool:
+        return map.lower() in self._images
+
+    def start(self):
+        if not self._task.is_running():
+            self._task.start()
+
+    def close(self):
+        self._task.cancel()
+
+    async def index(self):
+        try:
+            resp = await self.bot.http_client.get(MAPIMGS)
+            if resp.status != 200:
+                raise ValueError(f"status {resp.status}")
+            images = await asyncio.get_running_loop().run_in_executor(None, parse_index, resp.body)
+        except Exception as e:
+            # retry soon instead of going a whole refresh interval without images
+            _logger.warning(f"Failed to index map images, retrying in {self._retry:.0f}s: {e!r}")
+            self._task.change_interval(seconds=self._retry)
+            self._retry = min(self._retry * 2, RETRY_MAX)
+            return
+        if self._retry != RETRY_MIN:
+            self._retry = RETRY_MIN
+            self._task.change_interval(seconds=self.refresh)
+        self._images = images
+        _logger.info(f"Indexed {len(images)} map images")
 
-import aiohttp
-from bs4 import BeautifulSoup as bs
+    def url(self, map: str) -> t.Optional[str]:
+        return self._images.get(map.lower())
 
-loop = asyncio.get_event_loop()
+    async def thumbnail(self, map: str) -> t.Optional[bytes]:
+        """
+        jpeg bytes of the downscaled image of `map`, downloaded on first use
+            bytes rather than a cache path, the file can be evicted before the caller opens it
+        """
+        map = map.lower()
+        url = self.url(map)
+        if url is None:
+            return None
+        try:
+            return await self._thumbnails.get(map, lambda: self._load(map, url))
+        except Exception as e:
+            _logger.warning(f"Failed to get image of {map}: {e!r}")
+            return None
 
+    async def _load(self, map: str, url: str) -> bytes:
+        loop = asyncio.get_running_loop()
+        path = self.cache_dir / f"{map}.jpg"
+        content = await loop.run_in_executor(None, self._read, path)
+        if content is not None:
+            return content
+        resp = await self.bot.http_client.get(url)
+        if resp.status != 200:
+            raise ValueError(f"status {resp.status}")
+        return await loop.run_in_executor(None, self._save, resp.body, path)
 
-async def con():
-    _client: aiohttp.ClientSession = aiohttp.ClientSession()
-    _req = await _client.get(url="https://vauff.com/mapimgs/")
-    _web = bs(await _req.text(), "html.parser")
-    zemap = _web.find_all("a", href=re.compile("^/mapimgs/ze_"))
-    print(zemap)
-    await _client.close()
+    def _read(self, path: Path) -> t.Optional[bytes]:
+        try:
+            os.utime(path)
+            return path.read_bytes()
+        except FileNotFoundError:
+            return None
 
+    def _save(self, content: bytes, path: Path) -> bytes:
+        with Image.open(io.BytesIO(content)) as i:
+            i = i.convert("RGB")
+            i.thumbnail(self.size)
+            b = io.BytesIO()
+            i.save(b, "JPEG", quality=85)
+        thumbnail = b.getvalue()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        try:
+            with open(tmp, "wb") as f:
+                f.write(thumbnail)
+            os.replace(tmp, path)
+        except Exception:
+            tmp.unlink(missing_ok=True)
+            raise
+        self._evict()
+        return thumbnail
 
-loop.run_until_complete(con())
-# print(_web.content)
+    def _evict(self):
+        files = sorted(self.cache_dir.glob("*.jpg"), key=lambda p: p.stat().st_mtime)
+        for p in files[: max(len(files) - self.max_files, 0)]:
+            p.unlink(missing_ok=True)
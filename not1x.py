@@ -1,18 +1,26 @@
+import asyncio
 import typing as t
 from ipaddress import ip_address
 from itertools import chain
 
 import discord
-from discord.ext import bridge, commands, tasks
+from discord.ext import bridge, commands
 from discord.ext.commands.errors import *
 
 import ui_utils
 from command_error import CheckError
 from db import connection
 from enums import *
+from httpclient import HTTPClient
 from logs import setlog
-from tasks.map_task import ServerTask
-from utils import log_exception
+from map_list.catalogue import MapCatalogue
+from map_list.mapimgs import MapImages
+from source_query import SnapshotRegistry, get_querier
+from tasks.map_task import EditLimiter, ServerTask
+from tasks.notification import NotifyDispatcher, NotifyIndex
+from tasks.scheduler import PollScheduler
+from tasks.stats_buffer import StatsBuffer
+from utils import AsyncTTLCache, log_exception
 
 __version__ = "0.7"
 
@@ -41,19 +49,40 @@ class Bot(bridge.Bot):
 
         self._pl_list_button = False
         self._persiew: t.Dict[str, ui_utils.PlayerListV] = {}
-        self.server_task: t.Dict[str, tasks.Loop] = {}
+        self.scheduler = PollScheduler(
+            self,
+            interval=config.get("poll_interval", Data.TASK_INTERVAL.value),
+            concurrency=config.get("poll_concurrency", 10),
+        )
 
         self.exts = self.load_extension("cogs", recursive=True, store=True)
         self._failed_exts = [k for k, v in self.exts.items() if isinstance(v, Exception)]
         self._loaded_exts = [k for k, v in self.exts.items() if v is True]
         self.db = db
+        self.http_client = HTTPClient(**config.get("http", {}))
+        self.notify_index = NotifyIndex()
+        self.maps = MapCatalogue()
+        self.mapimgs = MapImages(self, **config.get("mapimgs", {}))
+        self.button_cache = AsyncTTLCache(config.get("button_cache_ttl", 30))
+        self.snapshots = SnapshotRegistry(config.get("snapshot_max_age", 90))
+        self.notifier = NotifyDispatcher(self, config.get("notify_workers", 4))
+        self.edit_limiter = EditLimiter(config.get("edit_concurrency", 10), config.get("edit_timeout", 30))
+        self.stats = StatsBuffer(self, config.get("stats_flush_minutes", 5))
 
     def run(self):
         super().run(token=self.__token)
 
     async def close(self):
         _logger.critical("Bot Closed!")
-        return await super().close()
+        # stop everything that edits messages or sends DMs while the client is still open
+        await self.scheduler.close()
+        await self.notifier.close()
+        self.mapimgs.close()
+        await super().close()
+        get_querier().close()
+        await self.http_client.close()
+        await self.stats.close()
+        await self.db.close()
 
     async def map_tasks(self):
         _sv_list: t.List[str] = self.config["serverquery"]
@@ -71,23 +100,24 @@ class Bot(bridge.Bot):
                 self.persview[_sv] = _view
                 self.add_view(_view)
             sv = ServerTask(self, _sv, _sv, self.persview[_sv])
-            self.server_task[_sv] = tasks.Loop(
-                sv.servercheck,
-                60,
-                discord.MISSING,
-                discord.MISSING,
-                time=discord.MISSING,
-                count=None,
-                loop=self.loop,
-                reconnect=True,
-            )
-        for task in self.server_task:
-            self.server_task[task].start()
-            self.server_task[task].get_task().set_name(task)
+            if _sv not in self.scheduler:
+                self.scheduler.add(sv, self.config.get("poll_intervals", {}).get(_sv))
+        self.stats.start()
+        self.mapimgs.start()
+        self.notifier.start()
+        self.scheduler.start()
 
         self._pl_list_button = True
         _logger.info("loop map task has been started!")
 
+    async def updatenotify(self, userid: int, name: str, maps: t.List[str], *, delete: bool = False):
+        if not await self.db.insertnotify(userid, name, maps, delete=delete):
+            return
+        if delete:
+            self.notify_index.remove(userid, maps)
+        else:
+            self.notify_index.add(userid, maps)
+
     @property
     def persview(self):
         return self._persiew
@@ -115,6 +145,11 @@ class Bot(bridge.Bot):
             _logger.warning(f"++++++ LOGGED AS DEVELOPER MODE ({self.user}) +++++")
             return
 
+        # record_tick upserts rely on the migrated keys, never start the map tasks without them
+        while not await self.db.migrate():
+            _logger.critical("Database schema is not ready, retrying in 30 seconds")
+            await asyncio.sleep(30)
+
         loaded_guilds = await self.db.execute(
             "SELECT `guild_id` FROM `guild_tracking`", fetch=True, fetchall=True, res=True
         )
@@ -137,6 +172,8 @@ class Bot(bridge.Bot):
             else:
                 await self.db.deleteguild(g_id)
 
+        await self.notify_index.load(self.db)
+
         if self.debug:
             _logger.warning("++++++ DEBUG MODE ENABLED +++++")
         else:
@@ -1,52 +1,111 @@
 import asyncio
+import functools
 import ipaddress
 import json
+import re
 import typing as t
 from concurrent import futures
 from concurrent.futures import Future
 from datetime import datetime
 
 import a2s
-import aiohttp
 import discord
+import soupsieve
 from a2s.info import SourceInfo
 from bs4 import BeautifulSoup as bs
+from bs4 import SoupStrainer
 
+from httpclient import HTTPClient
 from logs import setlog
+from source_query.location import UNKNOWN_LOCATION, LocationCache
+from source_query.querier import A2SQuerier, get_querier
+from source_query.snapshot import Snapshot, SnapshotRegistry
 
 _logger = setlog("SourceQuery")
+_locations = LocationCache("source_query/locations.json")
+
+
+def _normalize(name: str) -> str:
+    return " ".join(re.sub(r"[^0-9A-Z]+", " ", name.upper()).split())
+
+
+# gametracker names that don't match a country.json key
+COUNTRY_ALIASES = {
+    "United Kingdom": "GB",
+    "Great Britain": "GB",
+    "South Korea": "KR",
+    "North Korea": "KP",
+    "Russia": "RU",
+    "Netherlands": "NL",
+    "Iran": "IR",
+    "Philippines": "PH",
+    "Tanzania": "TZ",
+    "Syria": "SY",
+    "Laos": "LA",
+    "Libya": "LY",
+    "Brunei": "BN",
+    "Vatican City": "VA",
+    "Czechia": "CZ",
+    "Ivory Coast": "CI",
+    "Cote d'Ivoire": "CI",
+    "Congo, The Democratic Republic of the": "CD",
+    "Democratic Republic of the Congo": "CD",
+    "North Macedonia": "MK",
+    "Viet Nam": "VN",
+}
+
+
+def _load_countries(path: str = "country.json") -> t.Dict[str, str]:
+    with open(path, "r") as j:
+        country: t.Dict[str, str] = json.load(j)
+    index: t.Dict[str, str] = {}
+    for k, v in country.items():
+        index.setdefault(_normalize(k), v.lower())
+    for k, v in COUNTRY_ALIASES.items():
+        index[_normalize(k)] = v.lower()
+    return index
+
+
+COUNTRIES = _load_countries()
+_FLAG_SELECTOR = soupsieve.compile("span.blocknewheadercnt img")
+_FLAG_STRAINER = SoupStrainer("span", attrs={"class": "blocknewheadercnt"})
+
+
+@functools.lru_cache(maxsize=512)
+def country_code(name: str) -> str | None:
+    key = _normalize(name)
+    if key in COUNTRIES:
+        return COUNTRIES[key]
+    for k, v in COUNTRIES.items():
+        if key and key in k:
+            return v
+    return None
 
 
 def parseflag(content: str):
-    _res = {"flag": ":pirate_flag:", "location": "Unknown!"}
+    _res = UNKNOWN_LOCATION
     try:
-        _content = bs(content, "html.parser")
-        _country = _content.find("span", attrs={"class": "blocknewheadercnt"})
-        _image = _country.find("img")
+        _image = _FLAG_SELECTOR.select_one(bs(content, "html.parser", parse_only=_FLAG_STRAINER))
+        _title: str = _image["title"]
     except:
         return _res
-    with open("country.json", "r") as j:
-        country = json.load(j)
-        for k in country.keys():
-            if _image["title"].lower() in k.lower():
-                _res = {
-                    "flag": f":flag_{country[k].lower()}:",
-                    "location": _image["title"],
-                }
-                return _res
-
-
-async def get_location(ip: str) -> dict | None:
+    _code = country_code(_title)
+    if _code:
+        _res = {"flag": f":flag_{_code}:", "location": _title}
+    return _res
+
+
+async def get_location(ip: str, http: HTTPClient) -> dict:
+    return await _locations.get(ip, functools.partial(_fetch_location, http=http))
+
+
+async def _fetch_location(ip: str, http: HTTPClient) -> dict | None:
     url = f"https://www.gametracker.com/server_info/{ip}"
-    _res = {"flag": ":pirate_flag:", "location": "Unknown!"}
-    async with aiohttp.ClientSession() as ses:
-        async with ses.get(url) as req:
-            if req.status != 200:
-                return _res
-            else:
-                _res = await asyncio.get_running_loop().run_in_executor(
-                    None, parseflag, (await req.text(encoding="utf-8"))
-                )
+    _res = UNKNOWN_LOCATION
+    req = await http.get(url)
+    if req.status != 200:
+        return _res
+    _res = await asyncio.get_running_loop().run_in_executor(None, parseflag, req.text("utf-8"))
     return _res
 
 
@@ -110,16 +169,16 @@ class ServerInfo(discord.Embed):
 
     async def players(self) -> t.List[a2s.Player]:
         try:
-            return await a2s.aplayers((str(self.ip_port[0]), self.ip_port[1]), timeout=1)
+            return await get_querier().players(self.ip_port)
         except Exception as e:
             return []
 
 
-async def GetServer(ip: str, port: int):
-    loc = await get_location(f"{str(ip)}:{port}")
+async def GetServer(ip: str, port: int, http: HTTPClient):
+    loc = await get_location(f"{str(ip)}:{port}", http)
     ip_port = (str(ip), port)
     try:
-        _server: SourceInfo = await a2s.ainfo((str(ip), port), timeout=1)
+        _server: SourceInfo = await get_querier().info(ip_port)
     except:
         _server = SourceInfo()
         _server.map_name = "Unknown!"
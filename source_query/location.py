@@ -0,0 +1,90 @@
+import asyncio
+import json
+import os
+import time
+import typing as t
+from pathlib import Path
+
+from logs import setlog
+
+_logger = setlog("SourceQuery")
+
+Location = t.Dict[str, str]
+UNKNOWN_LOCATION: Location = {"flag": ":pirate_flag:", "location": "Unknown!"}
+
+
+class LocationCache:
+    """
+    ip -> location cache kept in memory and persisted to a json file
+
+    failed lookups are cached too, with a shorter ttl, concurrent lookups of the same ip share one fetch,
+    new entries are written to the file at most once every `save_delay` seconds
+    """
+
+    def __init__(self, path: str, ttl: float = 30 * 86400, negative_ttl: float = 3600, save_delay: float = 10) -> None:
+        self.path = Path(path)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.save_delay = save_delay
+        self._data: t.Dict[str, t.Tuple[float, Location]] = {}
+        self._inflight: t.Dict[str, asyncio.Future] = {}
+        self._loaded = False
+        self._saving: asyncio.Task | None = None
+
+    def _load(self):
+        self._loaded = True
+        try:
+            with open(self.path, "r") as f:
+                self._data = {k: (v[0], v[1]) for k, v in json.load(f).items()}
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            _logger.warning(f"Failed to load location cache: {e}")
+
+    def _save(self, data: t.Dict[str, t.Tuple[float, Location]]):
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    async def _delayed_save(self):
+        await asyncio.sleep(self.save_delay)
+        # snapshot on the loop, the executor must never iterate the live dict
+        now = time.time()
+        data = {k: v for k, v in self._data.items() if v[0] > now}
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._save, data)
+        except Exception as e:
+            _logger.warning(f"Failed to save location cache: {e}")
+
+    def _schedule_save(self):
+        if self._saving is None or self._saving.done():
+            self._saving = asyncio.get_running_loop().create_task(self._delayed_save())
+
+    async def get(self, ip: str, fetch: t.Callable[[str], t.Awaitable[Location | None]]) -> Location:
+        if not self._loaded:
+            self._load()
+        cached = self._data.get(ip)
+        if cached and cached[0] > time.time():
+            return cached[1]
+        if ip in self._inflight:
+            return await asyncio.shield(self._inflight[ip])
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[ip] = fut
+        try:
+            try:
+                res = await fetch(ip)
+            except Exception as e:
+                _logger.warning(f"Failed to get location of {ip}: {e}")
+                res = None
+            ok = bool(res) and res != UNKNOWN_LOCATION
+            res = res if ok else UNKNOWN_LOCATION
+            self._data[ip] = (time.time() + (self.ttl if ok else self.negative_ttl), res)
+            fut.set_result(res)
+        finally:
+            del self._inflight[ip]
+            if not fut.done():
+                fut.set_result(UNKNOWN_LOCATION)
+        self._schedule_save()
+        return res
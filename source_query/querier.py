@@ -0,0 +1,172 @@
+import asyncio
+import bz2
+import io
+import struct
+import typing as t
+
+from a2s.byteio import ByteReader
+from a2s.info import InfoProtocol, SourceInfo
+from a2s.players import Player, PlayersProtocol
+
+from logs import setlog
+
+_logger = setlog("SourceQuery")
+
+Address = t.Tuple[str, int]
+
+HEADER_SIMPLE = b"\xFF\xFF\xFF\xFF"
+HEADER_MULTI = b"\xFE\xFF\xFF\xFF"
+A2S_INFO = HEADER_SIMPLE + b"\x54Source Engine Query\x00"
+A2S_PLAYER = HEADER_SIMPLE + b"\x55"
+A2S_CHALLENGE_RESPONSE = 0x41
+NO_CHALLENGE = b"\xFF\xFF\xFF\xFF"
+
+
+class _Pending:
+    __slots__ = ("future", "fragments", "total")
+
+    def __init__(self, future: asyncio.Future) -> None:
+        self.future = future
+        self.fragments: t.Dict[int, bytes] = {}
+        self.total = 0
+
+
+class A2SQuerier(asyncio.DatagramProtocol):
+    """
+    A2S client multiplexing every query over one UDP socket
+
+    replies are matched to requests by source address, so only one query per address
+    is in flight at a time, queries to different servers run concurrently
+    """
+
+    def __init__(
+        self,
+        *,
+        timeout: float = 1.0,
+        min_timeout: float = 0.3,
+        max_timeout: float = 3.0,
+        retries: int = 1,
+        encoding: str = "utf-8",
+    ) -> None:
+        self.timeout = timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.retries = retries
+        self.encoding = encoding
+        self.transport: asyncio.DatagramTransport | None = None
+        self._pending: t.Dict[Address, _Pending] = {}
+        self._locks: t.Dict[Address, asyncio.Lock] = {}
+        self._rtt: t.Dict[Address, float] = {}
+
+    async def open(self):
+        if self.transport is None or self.transport.is_closing():
+            loop = asyncio.get_running_loop()
+            await loop.create_datagram_endpoint(lambda: self, local_addr=("0.0.0.0", 0))
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+    ####################### DatagramProtocol #######################
+    def connection_made(self, transport: asyncio.DatagramTransport):
+        self.transport = transport
+
+    def connection_lost(self, exc: Exception | None):
+        self.transport = None
+        for pending in self._pending.values():
+            if not pending.future.done():
+                pending.future.set_exception(ConnectionError("A2S socket closed"))
+
+    def datagram_received(self, data: bytes, addr: Address):
+        pending = self._pending.get(addr[:2])
+        if pending is None or pending.future.done():
+            return
+        if data[:4] == HEADER_SIMPLE:
+            pending.future.set_result(data[4:])
+        elif data[:4] == HEADER_MULTI:
+            self._fragment(pending, data[4:])
+
+    def error_received(self, exc: Exception):
+        _logger.debug(f"A2S socket error: {exc}")
+
+    ####################### End of DatagramProtocol #######################
+    def _fragment(self, pending: _Pending, data: bytes):
+        try:
+            packet_id, total, number, _size = struct.unpack_from("<IBBH", data)
+        except struct.error:
+            return
+        pending.total = total
+        pending.fragments[number] = data[8:]
+        if len(pending.fragments) < total:
+            return
+        payload = b"".join(pending.fragments[i] for i in range(total))
+        try:
+            if packet_id & 0x80000000:
+                payload = bz2.decompress(payload[8:])
+        except Exception as e:
+            pending.future.set_exception(e)
+            return
+        pending.future.set_result(payload[4:] if payload[:4] == HEADER_SIMPLE else payload)
+
+    def _timeout(self, addr: Address) -> float:
+        srtt = self._rtt.get(addr)
+        if srtt is None:
+            return self.timeout
+        return min(max(srtt * 3, self.min_timeout), self.max_timeout)
+
+    async def _exchange(self, addr: Address, packet: bytes) -> t.Tuple[bytes, float]:
+        loop = asyncio.get_running_loop()
+        timeout = self._timeout(addr)
+        for attempt in range(self.retries + 1):
+            pending = _Pending(loop.create_future())
+            self._pending[addr] = pending
+            sent = loop.time()
+            self.transport.sendto(packet, addr)
+            try:
+                data = await asyncio.wait_for(pending.future, timeout)
+            except asyncio.TimeoutError:
+                timeout = min(timeout * 2, self.max_timeout)
+                continue
+            finally:
+                self._pending.pop(addr, None)
+            rtt = loop.time() - sent
+            srtt = self._rtt.get(addr)
+            self._rtt[addr] = rtt if srtt is None else srtt * 0.8 + rtt * 0.2
+            return data, rtt
+        raise asyncio.TimeoutError(f"{addr[0]}:{addr[1]} did not respond after {self.retries + 1} attempt(s)")
+
+    async def _request(self, addr: Address, protocol: t.Any, request: t.Callable[[bytes], bytes]):
+        addr = (str(addr[0]), int(addr[1]))
+        await self.open()
+        lock = self._locks.setdefault(addr, asyncio.Lock())
+        async with lock:
+            challenge = NO_CHALLENGE
+            for _ in range(3):
+                data, ping = await self._exchange(addr, request(challenge))
+                reader = ByteReader(io.BytesIO(data), endian="<", encoding=self.encoding)
+                response_type = reader.read_uint8()
+                if response_type == A2S_CHALLENGE_RESPONSE:
+                    challenge = data[1:5]
+                    continue
+                if not protocol.validate_response_type(response_type):
+                    raise ValueError(f"Invalid A2S response type {response_type:#x} from {addr[0]}:{addr[1]}")
+                return protocol.deserialize_response(reader, response_type, ping)
+            raise ValueError(f"{addr[0]}:{addr[1]} keeps sending challenge responses")
+
+    async def info(self, addr: Address) -> SourceInfo:
+        return await self._request(
+            addr, InfoProtocol, lambda challenge: A2S_INFO + (challenge if challenge != NO_CHALLENGE else b"")
+        )
+
+    async def players(self, addr: Address) -> t.List[Player]:
+        return await self._request(addr, PlayersProtocol, lambda challenge: A2S_PLAYER + challenge)
+
+
+_querier: A2SQuerier | None = None
+
+
+def get_querier() -> A2SQuerier:
+    global _querier
+    if _querier is None:
+        _querier = A2SQuerier()
+    return _querier
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import time
+import typing as t
+
+from a2s.players import Player
+
+if t.TYPE_CHECKING:
+    from source_query import ServerInfo
+
+
+class Snapshot(t.NamedTuple):
+    info: ServerInfo
+    players: t.List[Player]
+    updated: float
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.updated
+
+
+class SnapshotRegistry:
+    """
+    latest ServerInfo and player list of every tracked server, published by the map task
+    """
+
+    def __init__(self, max_age: float = 90) -> None:
+        self.max_age = max_age
+        self._snapshots: t.Dict[str, Snapshot] = {}
+
+    def publish(self, ipport: str, info: ServerInfo, players: t.List[Player]):
+        self._snapshots[ipport] = Snapshot(info, players, time.monotonic())
+
+    def discard(self, ipport: str):
+        self._snapshots.pop(ipport, None)
+
+    def get(self, ipport: str, max_age: t.Optional[float] = None) -> t.Optional[Snapshot]:
+        """
+        snapshot of `ipport` if it is younger than `max_age`, defaults to the registry max age
+        """
+        snapshot = self._snapshots.get(ipport)
+        if snapshot is None or snapshot.age > (self.max_age if max_age is None else max_age):
+            return None
+        return snapshot
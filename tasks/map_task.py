@@ -1,18 +1,18 @@
 from __future__ import annotations
 
 import asyncio
-import re
+import time
 import typing as t
+from contextlib import asynccontextmanager
 from datetime import datetime
 from ipaddress import ip_address
 
 import discord
-import numpy as np
 
 from enums import *
 from logs import setlog
-from source_query import GetServer
-from utils import log_exception
+from source_query import GetServer, ServerInfo
+from utils import embed_fingerprint, log_exception
 
 if t.TYPE_CHECKING:
     import not1x
@@ -20,6 +20,25 @@ if t.TYPE_CHECKING:
 _logger = setlog(__name__)
 
 
+class EditLimiter:
+    """
+    caps concurrent tracking message edits bot-wide,
+    edits to the same channel share a rate limit bucket so they run one at a time
+    """
+
+    def __init__(self, concurrency: int = 10, timeout: float = 30) -> None:
+        self.timeout = timeout
+        self._sem = asyncio.Semaphore(concurrency)
+        self._channels: t.Dict[int, asyncio.Lock] = {}
+
+    @asynccontextmanager
+    async def acquire(self, channel: int):
+        lock = self._channels.setdefault(channel, asyncio.Lock())
+        async with lock:
+            async with self._sem:
+                yield
+
+
 class ServerTask:
     def __init__(
         self,
@@ -39,16 +58,54 @@ class ServerTask:
 
         self.isonline = False
         self.svname = None
-        self.serverinfo = None
+        self.serverinfo: ServerInfo | None = None
 
         self._notif = True
         self._retries = 0
         self._view = view
 
-        self._players = [0]
-
         self._maptime = datetime.now()
 
+        self._hydrated = False
+        # map changes not written to db yet, (map, date, players, timeplay)
+        self._pending: t.List[t.Tuple[str, str, int, int]] = []
+        self._ticks = 0
+        self._reconcile_every: int = bot.config.get("reconcile_ticks", 60)
+
+        self._edited: t.Dict[t.Tuple[int, int], t.Tuple[str, float]] = {}
+        self._max_staleness: float = bot.config.get("edit_max_staleness", 10) * 60
+
+    async def hydrate(self) -> bool:
+        """
+        load last map and map start time from db, the task owns this state afterwards
+            return False and keep the current state when the db query failed
+        """
+        state = await self.bot.db.getlaststate(self.ipport)
+        if state is None:
+            return False
+        self.mapname, self.playedtime = state
+        self._maptime = datetime.fromtimestamp(self.playedtime)
+        self._hydrated = True
+        return True
+
+    async def reconcile(self) -> None:
+        _map, _playedtime = self.mapname, self.playedtime
+        if not await self.hydrate():
+            _logger.warning(f"Could not reconcile {self.ipport} with db, keeping the current state")
+            return
+        if (_map, _playedtime) != (self.mapname, self.playedtime):
+            _logger.warning(f"State of {self.ipport} drifted from db, reloaded ({_map} -> {self.mapname})")
+
+    async def writeback(self) -> None:
+        """
+        write pending map changes to db in order, whatever fails is retried on the next tick
+        """
+        while self._pending:
+            map, date, players, timeplay = self._pending[0]
+            if not await self.bot.db.record_tick(self.ipport, map, date, players, 0, newmap=True, timeplay=timeplay):
+                return
+            self._pending.pop(0)
+
     async def editmsg(
         self,
         guild: int,
@@ -57,7 +114,7 @@ class ServerTask:
         channel: discord.TextChannel,
         embed: discord.Embed,
         view: discord.ui.View,
-    ):
+    ) -> bool:
         msg: discord.PartialMessage = channel.get_partial_message(message)
         try:
             await msg.edit(embed=embed, view=view)
@@ -75,34 +132,84 @@ class ServerTask:
             pass
         except Exception as e:
             log_exception(e, base_err)
+        else:
+            return True
+        return False
+
+    async def queue_edit(
+        self,
+        guild: int,
+        ip: str,
+        message: int,
+        channel: discord.TextChannel,
+        embed: discord.Embed,
+        fingerprint: str,
+    ):
+        """
+        edit one tracking message through the bot edit limiter, failures are logged and never raised
+            skipped when the displayed content didn't change and the message isn't older than max staleness
+        """
+        key = (guild, message)
+        last = self._edited.get(key)
+        now = time.monotonic()
+        if last and last[0] == fingerprint and now - last[1] < self._max_staleness:
+            return
+        try:
+            async with self.bot.edit_limiter.acquire(channel.id):
+                if await asyncio.wait_for(
+                    self.editmsg(guild, ip, message, channel, embed, self._view), self.bot.edit_limiter.timeout
+                ):
+                    self._edited[key] = (fingerprint, now)
+        except asyncio.TimeoutError:
+            _logger.warning(f"Timed out editing tracking message {message} on {channel.id}")
+        except Exception as e:
+            log_exception(e, base_err)
 
     async def servercheck(self) -> None:
         _st = datetime.now()
-        self.mapname = await self.bot.db.getlastmap(self.ipport)
+        if not self._hydrated:
+            if not await self.hydrate():
+                # without the last map every subscriber would be notified again, retry next tick
+                _logger.warning(f"Could not load the state of {self.ipport} from db")
+                return
+        elif self._pending:
+            # db is behind the in-memory state, never reload from it until the writes land
+            await self.writeback()
+        elif self._ticks % self._reconcile_every == 0:
+            await self.reconcile()
+        self._ticks += 1
         ip = ip_address(self.ipport.split(":")[0])
         port = int(self.ipport.split(":")[1])
 
-        server_info = await GetServer(ip=str(ip), port=port)
+        server_info = await GetServer(ip=str(ip), port=port, http=self.bot.http_client)
+        self.serverinfo = server_info
 
         self.isonline = server_info.status
 
         date_now = _st.strftime("%Y-%m-%d")
-        if self.mapname != server_info.maps and server_info.status:
-
-            await self.bot.db.updateserver(self.ipport, server_info.maps, date_now)
-            await self.bot.db.updatelastmap(self.ipport, server_info.maps, round(_st.timestamp()))
-
+        newmap = self.mapname != server_info.maps and server_info.status
+        if newmap:
             self._notif = False
             self.mapname = server_info.maps
-            self._players.clear()
-
-        self.playedtime = round(await self.bot.db.getlastmaptime(self.ipport))
-        self._maptime = datetime.fromtimestamp(self.playedtime)
-        self._players.append(server_info.player)
-        await self.bot.db.updateplayers(self.ipport, self.mapname, date_now, round(np.average(self._players)))
-        await self.bot.db.updatemaptime(self.ipport, self.mapname, date_now, (_st - self._maptime).seconds / 60)
+            self.playedtime = round(_st.timestamp())
+            self._maptime = datetime.fromtimestamp(self.playedtime)
+            self._pending.append((self.mapname, date_now, server_info.player, self.playedtime))
+            await self.writeback()
+
+        if self.mapname is not MapEnum.UNKOWN:
+            await self.bot.stats.add(
+                self.ipport,
+                self.mapname,
+                date_now,
+                server_info.player,
+                round((_st - self._maptime).seconds / 60),
+            )
 
         server_info.add_field(name="Map played: ", value=f"<t:{self.playedtime}:R>", inline=False)
+        _image = self.bot.mapimgs.url(server_info.maps) if server_info.status else None
+        if _image:
+            server_info.set_thumbnail(url=_image)
+        self.bot.snapshots.publish(self.ipport, server_info, await server_info.players() if self.isonline else [])
 
         if self._retries >= 10 and server_info.status:
             _logger.info(f"Connection established for {self.ipport}")
@@ -114,15 +221,13 @@ class ServerTask:
 
         if not self._notif and self.ipport != "103.62.48.10:27058" and self.isonline:
             self._notif = True
-            async for userid in self.bot.db.fetchuserid():
-                _user = self.bot.get_user(userid)
-                if not _user:
-                    continue
-                async for map in self.bot.db.getnotify(userid):
-                    if not re.search(map.lower(), self.mapname.lower()):
-                        continue
-                    await asyncio.wait_for(_user.send(embed=server_info), timeout=30)
+            _key = f"{self.ipport}:{self.mapname}:{self.playedtime}"
+            self.bot.notifier.dispatch(self.bot.notify_index.match(self.mapname), server_info, _key)
 
+        edits = []
+        fingerprint = embed_fingerprint(server_info)
+        if self._retries == 10:
+            _logger.warning(f"Connection Timeout for {self.ipport}")
         async for _, guild, channel, tracking_ip, message in self.bot.db.fetchip(self.ipport):
             channel: discord.TextChannel = self.bot.get_channel(channel)
             if not channel:
@@ -130,13 +235,7 @@ class ServerTask:
 
             if self._retries >= 10:
                 if self._retries == 10:
-                    _logger.warning(f"Connection Timeout for {self.ipport}")
-                    try:
-                        await asyncio.wait_for(
-                            self.editmsg(guild, tracking_ip, message, channel, server_info, self._view), 30
-                        )
-                    except:
-                        pass
+                    edits.append(self.queue_edit(guild, tracking_ip, message, channel, server_info, fingerprint))
                 if self._retries == 10080:
                     _logger.critical(f"Shutting down {self.ipport} from map task, failed to respond within a week")
                     try:
@@ -144,9 +243,11 @@ class ServerTask:
                         await _msg.delete()
                     except:
                         _logger.error(f"Cant delete message on {guild}")
-                    self.bot.server_task[self.ipport].stop()
+                    self.bot.scheduler.remove(self.ipport)
+                    self.bot.snapshots.discard(self.ipport)
                 continue
-            await asyncio.wait_for(self.editmsg(guild, tracking_ip, message, channel, server_info, self._view), 30)
+            edits.append(self.queue_edit(guild, tracking_ip, message, channel, server_info, fingerprint))
+        await asyncio.gather(*edits)
 
         _et = datetime.now()
         # _logger.debug(_et - _st)
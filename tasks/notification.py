@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import asyncio
+import re
+import time
+import typing as t
+from collections import Counter
+
+import discord
+
+from enums import *
+from logs import setlog
+from utils import log_exception
+
+if t.TYPE_CHECKING:
+    import not1x
+    from db import connection
+
+_logger = setlog(__name__)
+
+_REGEX_CHARS = frozenset(".^$*+?{}[]\\|()")
+
+
+class NotifyIndex:
+    """
+    in-memory map notification subscriptions
+
+    entries without regex characters are matched as substrings of the map name through a hash lookup
+    of every substring length in use, other entries are compiled once and shared by every subscriber
+    """
+
+    def __init__(self) -> None:
+        self._literals: t.Dict[str, t.Set[int]] = {}
+        self._lengths: t.Counter[int] = Counter()
+        self._patterns: t.Dict[str, t.Tuple[re.Pattern, t.Set[int]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._literals) + len(self._patterns)
+
+    @staticmethod
+    def _compile(entry: str) -> re.Pattern:
+        try:
+            return re.compile(entry)
+        except re.error:
+            return re.compile(re.escape(entry))
+
+    def add(self, userid: int, maps: t.Iterable[str]):
+        for entry in maps:
+            entry = entry.lower()
+            if not entry:
+                continue
+            if _REGEX_CHARS.isdisjoint(entry):
+                if entry not in self._literals:
+                    self._literals[entry] = set()
+                    self._lengths[len(entry)] += 1
+                self._literals[entry].add(userid)
+            else:
+                if entry not in self._patterns:
+                    self._patterns[entry] = (self._compile(entry), set())
+                self._patterns[entry][1].add(userid)
+
+    def remove(self, userid: int, maps: t.Iterable[str]):
+        for entry in maps:
+            entry = entry.lower()
+            if entry in self._literals:
+                self._literals[entry].discard(userid)
+                if not self._literals[entry]:
+                    del self._literals[entry]
+                    self._lengths[len(entry)] -= 1
+                    if not self._lengths[len(entry)]:
+                        del self._lengths[len(entry)]
+            elif entry in self._patterns:
+                self._patterns[entry][1].discard(userid)
+                if not self._patterns[entry][1]:
+                    del self._patterns[entry]
+
+    async def load(self, db: connection):
+        self._literals.clear()
+        self._lengths.clear()
+        self._patterns.clear()
+        async for _, userid, _, notified_map in db.fetchuser():
+            self.add(userid, [notified_map])
+        _logger.info(f"Loaded {len(self)} notification entries")
+
+    def match(self, mapname: str) -> t.Set[int]:
+        """
+        get every user subscribed to `mapname`
+        """
+        name = mapname.lower()
+        users: t.Set[int] = set()
+        for length in self._lengths:
+            for i in range(len(name) - length + 1):
+                subs = self._literals.get(name[i : i + length])
+                if subs:
+                    users |= subs
+        for pattern, subs in self._patterns.values():
+            if pattern.search(name):
+                users |= subs
+        return users
+
+
+class _Job(t.NamedTuple):
+    userid: int
+    key: str
+    embed: discord.Embed
+    queued: float
+
+
+class NotifyDispatcher:
+    """
+    background queue sending map notification DMs
+
+    a user gets one DM per map change however many of their entries match,
+    `workers` DMs are sent at once and rate limited sends are retried
+    """
+
+    def __init__(self, bot: not1x.Bot, workers: int = 4, retries: int = 3, timeout: float = 30) -> None:
+        self.bot = bot
+        self.retries = retries
+        self.timeout = timeout
+        self._workers_count = workers
+        self._workers: t.List[asyncio.Task] = []
+        self._queue: asyncio.Queue[_Job] = asyncio.Queue()
+        self._queued: t.Set[t.Tuple[int, str]] = set()
+
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.latency = 0.0
+        self.max_latency = 0.0
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def metrics(self) -> t.Dict[str, float]:
+        return {
+            "depth": self.depth,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "latency": round(self.latency, 3),
+            "max_latency": round(self.max_latency, 3),
+        }
+
+    def start(self):
+        if self._workers:
+            return
+        self._workers = [
+            self.bot.loop.create_task(self._worker(), name=f"NotifyWorker{n}") for n in range(self._workers_count)
+        ]
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+        _logger.info(f"Notification dispatcher closed: {self.metrics}")
+
+    def dispatch(self, userids: t.Iterable[int], embed: discord.Embed, key: str) -> int:
+        """
+        queue `embed` for every user, `key` identifies the map change users are deduplicated on
+        """
+        queued = 0
+        now = time.monotonic()
+        for userid in userids:
+            if (userid, key) in self._queued:
+                continue
+            self._queued.add((userid, key))
+            self._queue.put_nowait(_Job(userid, key, embed, now))
+            queued += 1
+        if queued:
+            _logger.info(f"Queued {queued} notification(s) for {key}, queue depth: {self.depth}")
+        return queued
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                if await self._send(job):
+                    self.sent += 1
+                else:
+                    self.failed += 1
+            except Exception as e:
+                self.failed += 1
+                log_exception(e, base_err)
+            finally:
+                self._queued.discard((job.userid, job.key))
+                self._queue.task_done()
+            latency = time.monotonic() - job.queued
+            self.latency = latency if not self.latency else self.latency * 0.9 + latency * 0.1
+            self.max_latency = max(self.max_latency, latency)
+            if (self.sent + self.failed) % 100 == 0:
+                _logger.info(f"Notification dispatcher: {self.metrics}")
+
+    async def _send(self, job: _Job) -> bool:
+        _user = self.bot.get_user(job.userid)
+        if not _user:
+            return False
+        for attempt in range(self.retries + 1):
+            try:
+                await asyncio.wait_for(_user.send(embed=job.embed), timeout=self.timeout)
+            except discord.Forbidden:
+                return False
+            except discord.HTTPException as e:
+                if e.status != 429 or attempt >= self.retries:
+                    raise
+                retry_after = float(e.response.headers.get("Retry-After", 2**attempt))
+                self.retried += 1
+                await asyncio.sleep(retry_after)
+            except asyncio.TimeoutError:
+                if attempt >= self.retries:
+                    raise
+                self.retried += 1
+            else:
+                return True
+        return False
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import typing as t
+
+from enums import *
+from logs import setlog
+from utils import log_exception
+
+if t.TYPE_CHECKING:
+    import not1x
+    from tasks.map_task import ServerTask
+
+_logger = setlog(__name__)
+
+
+class _Entry:
+    __slots__ = ("task", "interval", "paused", "runner")
+
+    def __init__(self, task: ServerTask, interval: float) -> None:
+        self.task = task
+        self.interval = interval
+        self.paused = False
+        self.runner: asyncio.Task | None = None
+
+
+class PollScheduler:
+    """
+    runs every ServerTask.servercheck from one place
+
+    start offsets are spread across the interval so servers don't poll on the same second,
+    and at most `concurrency` checks run at once
+    """
+
+    def __init__(self, bot: not1x.Bot, interval: float = Data.TASK_INTERVAL.value, concurrency: int = 10) -> None:
+        self.bot = bot
+        self.interval = interval
+        self._sem = asyncio.Semaphore(concurrency)
+        self._entries: t.Dict[str, _Entry] = {}
+        self._started = False
+
+    def __contains__(self, ipport: str) -> bool:
+        return ipport in self._entries
+
+    @property
+    def tasks(self) -> t.Dict[str, ServerTask]:
+        return {k: v.task for k, v in self._entries.items()}
+
+    def get(self, ipport: str) -> t.Optional[ServerTask]:
+        entry = self._entries.get(ipport)
+        return entry.task if entry else None
+
+    def add(self, task: ServerTask, interval: t.Optional[float] = None):
+        if task.ipport in self._entries:
+            raise ValueError(f"{task.ipport} is already scheduled")
+        entry = _Entry(task, interval or self.interval)
+        self._entries[task.ipport] = entry
+        if self._started:
+            self._spawn(entry, random.uniform(0, entry.interval))
+
+    def remove(self, ipport: str) -> t.Optional[ServerTask]:
+        entry = self._entries.pop(ipport, None)
+        if entry is None:
+            return None
+        # a task removing itself finishes its current check, the loop then exits
+        if entry.runner and entry.runner is not asyncio.current_task():
+            entry.runner.cancel()
+        _logger.info(f"Removed {ipport} from poll scheduler")
+        return entry.task
+
+    def pause(self, ipport: str):
+        self._entries[ipport].paused = True
+
+    def resume(self, ipport: str):
+        self._entries[ipport].paused = False
+
+    def start(self):
+        if self._started:
+            return
+        self._started = True
+        entries = list(self._entries.values())
+        for num, entry in enumerate(entries):
+            slot = entry.interval / len(entries)
+            self._spawn(entry, num * slot + random.uniform(0, slot))
+        _logger.info(f"Poll scheduler started with {len(entries)} server(s)")
+
+    async def close(self):
+        self._started = False
+        runners = [e.runner for e in self._entries.values() if e.runner]
+        for runner in runners:
+            runner.cancel()
+        await asyncio.gather(*runners, return_exceptions=True)
+
+    def _spawn(self, entry: _Entry, offset: float):
+        entry.runner = self.bot.loop.create_task(self._run(entry, offset), name=entry.task.ipport)
+
+    async def _run(self, entry: _Entry, offset: float):
+        loop = asyncio.get_running_loop()
+        await asyncio.sleep(offset)
+        deadline = loop.time()
+        while self._entries.get(entry.task.ipport) is entry:
+            if not entry.paused:
+                async with self._sem:
+                    try:
+                        await entry.task.servercheck()
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        _logger.error(f"Server check for {entry.task.ipport} failed with error: {e}")
+                        log_exception(e, base_err)
+            deadline += entry.interval
+            # skip missed ticks instead of bursting to catch up
+            if deadline < loop.time():
+                deadline = loop.time()
+            await asyncio.sleep(deadline - loop.time())
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import asyncio
+import typing as t
+
+from logs import setlog
+from tasks.create_task import CustomTask
+
+if t.TYPE_CHECKING:
+    import not1x
+
+_logger = setlog(__name__)
+
+StatsKey = t.Tuple[str, str, str]
+
+
+class _Stats:
+    __slots__ = ("count", "total", "peak", "playtime", "flushed")
+
+    def __init__(self, base_playtime: int = 0) -> None:
+        self.count = 0
+        self.total = 0
+        self.peak = 0
+        self.playtime = 0
+        # (count, total, playtime) already added to server_info and the server_daily rollup
+        self.flushed = (0, 0, base_playtime)
+
+    @property
+    def dirty(self) -> bool:
+        return self.count != self.flushed[0]
+
+    def add(self, players: int, playtime: int):
+        self.count += 1
+        self.total += players
+        self.peak = max(self.peak, players)
+        self.playtime = playtime
+
+
+class StatsBuffer:
+    """
+    write-behind buffer for server_info player/playtime stats and the server_daily rollup
+
+    keeps player and playtime totals per (ip, map, date) and adds what changed to db when the key
+    of a server changes (map change or new day), every `flush_minutes` and on close
+    """
+
+    def __init__(self, bot: not1x.Bot, flush_minutes: int = 5) -> None:
+        self.bot = bot
+        self._stats: t.Dict[StatsKey, _Stats] = {}
+        self._current: t.Dict[str, StatsKey] = {}
+        self._lock = asyncio.Lock()
+        self._task = CustomTask(bot, self.flush, flush_minutes * 60, name="StatsBuffer")
+
+    def start(self):
+        if not self._task.is_running():
+            self._task.start()
+
+    async def add(self, ip: str, map: str, date: str, players: int, playtime: int):
+        key = (ip, map, date)
+        last = self._current.get(ip)
+        if last is not None and last != key:
+            await self._write([last])
+        self._current[ip] = key
+        if key not in self._stats:
+            # only minutes played from the first sample on count for the rollup, that is 0 for a new map
+            # and skips what was already counted for a map carried over midnight or a bot restart
+            self._stats[key] = _Stats(playtime)
+        self._stats[key].add(players, playtime)
+
+    async def flush(self):
+        await self._write(list(self._stats))
+
+    async def _write(self, keys: t.List[StatsKey]):
+        async with self._lock:
+            rows = []
+            daily = []
+            flushed = []
+            for key in keys:
+                stats = self._stats.get(key)
+                if stats is None or not stats.dirty:
+                    continue
+                ip, _, date = key
+                count, total, playtime = stats.flushed
+                played = max(stats.playtime - playtime, 0)
+                rows.append((*key, played, round((stats.total - total) / (stats.count - count))))
+                daily.append((ip, date, played, stats.total - total, stats.count - count, stats.peak))
+                flushed.append((key, (stats.count, stats.total, max(stats.playtime, playtime))))
+            if not rows or not await self.bot.db.flushstats(rows, daily):
+                return
+            for key, snapshot in flushed:
+                stats = self._stats[key]
+                # samples added while writing stay dirty for the next flush
+                stats.flushed = snapshot
+                if not stats.dirty and self._current.get(key[0]) != key:
+                    del self._stats[key]
+
+    async def close(self):
+        self._task.cancel()
+        await self.flush()
+        _logger.info("Server stats flushed")
@@ -7,6 +7,7 @@ from datetime import datetime
 from ipaddress import ip_address
 from itertools import chain
 
+import a2s
 import discord
 import numpy as np
 import pandas as pd
@@ -14,7 +15,7 @@ import pandas as pd
 from db import iterdb
 from enums import *
 from logs import setlog
-from source_query import GetServer
+from source_query import GetServer, ServerInfo
 from utils import most_color, parse_history
 
 if t.TYPE_CHECKING:
@@ -44,10 +45,27 @@ class PlayerListV(discord.ui.View):
             _btn.callback = self.buttons[btn]["callback"]
             self.add_item(_btn)
 
+    async def server(self) -> ServerInfo:
+        """
+        latest map task result when fresh enough, else a cached query shared by concurrent clicks
+        """
+        snapshot = self.bot.snapshots.get(self.ipport)
+        if snapshot:
+            return snapshot.info
+        return await self.bot.button_cache.get(
+            ("server", self.ipport), lambda: GetServer(self.ip, self.port, self.bot.http_client)
+        )
+
+    async def players(self, server: ServerInfo) -> t.List[a2s.Player]:
+        snapshot = self.bot.snapshots.get(self.ipport)
+        if snapshot:
+            return snapshot.players
+        return await self.bot.button_cache.get(("players", self.ipport), server.players)
+
     async def sendplayer(self, _interaction: discord.Interaction):
         await _interaction.response.defer(ephemeral=True)
-        _sv = await GetServer(self.ip, self.port)
-        _pl = await _sv.players()
+        _sv = await self.server()
+        _pl = await self.players(_sv)
         if not len(_pl):
             await _interaction.followup.send(content="Server doesn't respond or no players online", ephemeral=True)
             return
@@ -67,7 +85,7 @@ class PlayerListV(discord.ui.View):
 
     async def sendstats(self, _interaction: discord.Interaction):
         await _interaction.response.defer(ephemeral=True)
-        _sv = await GetServer(self.ip, self.port)
+        _sv = await self.server()
         if not _sv.status:
             await _interaction.followup.send("Server is offline!", ephemeral=True)
             return
@@ -75,9 +93,9 @@ class PlayerListV(discord.ui.View):
         em.title = _sv.name
         em.color = discord.Color.blurple()
 
-        data = await self.bot.db.fetchserverdata(self.ipport)
-
-        data = data[:24]
+        data = await self.bot.button_cache.get(
+            ("stats", self.ipport), lambda: self.bot.db.fetchserverdata(self.ipport, limit=24)
+        )
 
         listed = list(parse_history(data))
         for l in listed:
@@ -100,23 +118,17 @@ class PlayerListV(discord.ui.View):
 
     async def weekstats(self, _interaction: discord.Interaction):
         await _interaction.response.defer(ephemeral=True)
-        data = await self.bot.db.fetchserverdata(self.ipport)
-
-        def sortday():
-            return [a for a in data if (datetime.now() - a.lastplayed).days < 7]
-
-        data = await self.bot.loop.run_in_executor(None, sortday)
-
-        listed = list(parse_history(data))
-        total_average = [a["Average_Player"] for a in listed]
-
+        listed, summary = await self.bot.button_cache.get(
+            ("weekstats", self.ipport),
+            lambda: asyncio.gather(self.bot.db.getsummary(self.ipport, 7), self.bot.db.getdailysummary(self.ipport, 7)),
+        )
         df = pd.DataFrame(
             listed,
             index=None,
+            columns=list(ServerHistory.__annotations__),
         )
-        df = df.sort_values("Play_Time", ascending=False, ignore_index=True)
         stringdata = (
-            f"Playtime is in minutes, Date are UTC+0\n\nServer IP: {self.ipport}\nTotal Average Players: {np.average(total_average):.2f}\nSorted By Most PlayTime\n"
+            f"Playtime is in minutes, Date are UTC+0\n\nServer IP: {self.ipport}\nTotal Average Players: {summary.average_players:.2f}\nPeak Players: {summary.peak_players}\nSorted By Most PlayTime\n"
             + df.to_string()
         )
         b = io.BytesIO(bytes(stringdata, "utf-8"))
@@ -250,7 +262,7 @@ async def select_map(ctx: discord.ApplicationContext, opt: t.List[discord.Select
 
     embed.description = "\n".join([a for a in selected])
     if not _c.cancel and len(selected) > 0:
-        await bot.db.insertnotify(ctx.author.id, ctx.author, selected, delete=edit)
+        await bot.updatenotify(ctx.author.id, ctx.author, selected, delete=edit)
     if _c.cancel:
         embed.title = "Option Canceled!"
         embed.description = embed.Empty
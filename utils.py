@@ -1,7 +1,12 @@
+import asyncio
+import hashlib
 import io
+import json
 import secrets
+import time
 import traceback
 import typing as t
+from collections import OrderedDict
 from datetime import datetime
 from pathlib import Path
 
@@ -18,27 +23,94 @@ _logger = setlog(__name__)
 help_command = {}
 
 
+class AsyncTTLCache:
+    """
+    lru cache of coroutine results expiring after `ttl` seconds, concurrent misses of a key share one call
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 256) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: t.OrderedDict[t.Hashable, t.Tuple[float, t.Any]] = OrderedDict()
+        self._inflight: t.Dict[t.Hashable, asyncio.Future] = {}
+
+    def invalidate(self, key: t.Hashable):
+        self._data.pop(key, None)
+
+    def set(self, key: t.Hashable, value: t.Any):
+        now = time.monotonic()
+        self._data[key] = (now + self.ttl, value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            # expired entries go first, then the least recently used
+            for k in [k for k, v in self._data.items() if v[0] <= now]:
+                del self._data[k]
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    async def get(self, key: t.Hashable, factory: t.Callable[[], t.Awaitable[t.Any]]) -> t.Any:
+        cached = self._data.get(key)
+        if cached:
+            if cached[0] > time.monotonic():
+                self._data.move_to_end(key)
+                return cached[1]
+            del self._data[key]
+        if key in self._inflight:
+            return await asyncio.shield(self._inflight[key])
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            value = await factory()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            # mark retrieved so an unawaited failure isn't logged
+            fut.exception()
+            raise
+        else:
+            self.set(key, value)
+            fut.set_result(value)
+            return value
+        finally:
+            del self._inflight[key]
+
+
+COLOR_SAMPLE_SIZE = 64
+_color_cache = AsyncTTLCache(ttl=86400, maxsize=512)
+
+
 async def most_color(asset: discord.Asset | None) -> discord.Colour:
     if not asset:
         return discord.Colour.from_rgb(245, 204, 22)
 
-    with Image.open(io.BytesIO(await asset.read())) as i:
-        i = i.convert("RGB")
-        color_size = len(i.getdata())
-        r = round(sum([_r for _r in i.getdata(0)]) / color_size)
-        g = round(sum([_r for _r in i.getdata(1)]) / color_size)
-        b = round(sum([_r for _r in i.getdata(2)]) / color_size)
-        return discord.Colour.from_rgb(r, g, b)
+    async def _compute():
+        # the cdn serves a small rendition, no need to download the full size asset
+        data = await asset.with_size(COLOR_SAMPLE_SIZE * 2).read()
+        rgb = await asyncio.get_running_loop().run_in_executor(None, dominant_color, io.BytesIO(data))
+        return discord.Colour.from_rgb(*rgb)
 
+    # asset keys are content hashes, a changed avatar gets a new key
+    return await _color_cache.get(asset.key, _compute)
 
-def dominant_color(file: str | bytes):
+
+def dominant_color(file: str | bytes | t.BinaryIO):
     with Image.open(file) as i:
+        i.draft("RGB", (COLOR_SAMPLE_SIZE, COLOR_SAMPLE_SIZE))
         i = i.convert("RGB")
-        color_size = len(i.getdata())
-        r = round(sum([_r for _r in i.getdata(0)]) / color_size)
-        g = round(sum([_r for _r in i.getdata(1)]) / color_size)
-        b = round(sum([_r for _r in i.getdata(2)]) / color_size)
-        return (r, g, b)
+        i.thumbnail((COLOR_SAMPLE_SIZE, COLOR_SAMPLE_SIZE), Image.BOX)
+        r, g, b = np.rint(np.asarray(i, dtype=np.float32).reshape(-1, 3).mean(axis=0)).astype(int)
+        return (int(r), int(g), int(b))
+
+
+def embed_fingerprint(embed: discord.Embed) -> str:
+    """
+    hash of what an embed displays, ignoring its timestamp
+    """
+    data = embed.to_dict()
+    data.pop("timestamp", None)
+    return hashlib.blake2b(json.dumps(data, sort_keys=True, default=str).encode(), digest_size=16).hexdigest()
 
 
 def log_exception(exc: Exception, typ: ExcType, id: int = 0):
@@ -57,26 +129,23 @@ def log_exception(exc: Exception, typ: ExcType, id: int = 0):
 
 
 def parse_history(history: t.List[server_info]):
-    data: t.Dict[str, ServerHistory] = {}
-    for s in history:
-        if s.map not in data:
-            data[s.map] = {
-                "Map": s.map,
-                "Play_Time": s.playtime,
-                "Played": s.played,
-                "Average_Player": [s.average_players],
-                "Last_Played": s.lastplayed,
-            }
-        else:
-            if data[s.map]["Last_Played"] < s.lastplayed:
-                data[s.map]["Last_Played"] = s.lastplayed
-            data[s.map]["Play_Time"] += s.playtime
-            data[s.map]["Played"] += s.played
-            data[s.map]["Average_Player"].append(s.average_players)
-    for k in data:
-        total = np.average(data[k]["Average_Player"])
-        data[k]["Average_Player"]: float = round(total, 2)
-        yield ServerHistory(**data[k])
+    if not history:
+        return
+    df = pd.DataFrame.from_records(history, columns=server_info._fields)
+    grouped = df.groupby("map", sort=False).agg(
+        Play_Time=("playtime", "sum"),
+        Played=("played", "sum"),
+        Average_Player=("average_players", "mean"),
+        Last_Played=("lastplayed", "max"),
+    )
+    for _map, Play_Time, Played, Average_Player, Last_Played in grouped.itertuples(name=None):
+        yield ServerHistory(
+            Map=_map,
+            Play_Time=int(Play_Time),
+            Played=int(Played),
+            Average_Player=round(float(Average_Player), 2),
+            Last_Played=pd.Timestamp(Last_Played).to_pydatetime(),
+        )
 
 
 def addhelp(help):